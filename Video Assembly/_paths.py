@@ -0,0 +1,13 @@
+'''
+README : Import paths of the video assembler.
+
+The script model, the profiler and the generation stages live in `diffusion/scripts`, which isn't a package. Every
+module of the video assembler that needs them imports this module first, which adds that folder to `sys.path` once.
+'''
+import os
+import sys
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "diffusion", "scripts"))
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
@@ -1,8 +1,8 @@
 ''' 
 README : The video assembler takes all the images in the Images folder and all the audio files in the Audio folder and the text-to-script from json file and concatenates 
 them into a video. The duration of the picture displayed is same as the duration of the audio for that image. The Images and
-Audio files sorted alphabetically and then compiled in that order. It is recommended to store the Audio and Image files by 
-numbering them.
+Audio files are paired with the scenes of the script by `assets.resolve_assets`, by scene id (`scene_{timestamp}.png`,
+`segment_{n}.wav`) or by number (`1.jpg`, `2.mp3`, ...), and every scene is checked before rendering starts.
 '''
 ''' MAIN THINGS TODO
 1. TODO: Main Video Assembly Engine (Done by Souryabrata)
@@ -20,14 +20,37 @@ TODO: 1. Add a small delay to ensure smoother transition from clip to clip. (Ass
 TODO: 2. Experiment with adding Title screen, text and transitions, and other effects. (Assigned to Nancy)
 TODO  3. Test the script against a large number of images with higher resolutions and audio files, document the performance.
 TODO: 4. Test the script with various different audio and video extensions and codecs, find the best combination. 
-TODO: 5. Allow the script to automatically assign the proper codec with the respective file extension.
+(Done, see `bench_encoding.py`)
+TODO: 5. Allow the script to automatically assign the proper codec with the respective file extension. (Done, see
+`encoding_profiles.py`)
 TODO: 6. Run proper tests to document when video compiler corruption happens.
 '''
 import os
-from moviepy import ImageClip, concatenate_videoclips, AudioFileClip,TextClip,CompositeVideoClip,vfx
+import time
+from moviepy import ImageClip, AudioFileClip,TextClip,CompositeVideoClip,vfx
 from moviepy.video.tools.subtitles import SubtitlesClip
 import pysrt 
-import json
+from still_segments import SegmentSpec, canvas_size, render_segmented_video
+from segment_cache import SegmentCache
+from subtitle_overlay import SubtitleOverlay
+from timeline import concatenate_indexed
+from audio_manifest import AudioManifest
+from subtitle_timeline import SubtitleTimeline
+from assets import resolve_assets, scan_folder
+from encoding_profiles import encoder_settings
+from image_prep import ImagePrep
+from lazy_clips import MediaPool
+from ffmpeg_backend import render_filter_graph
+from vfr import hold_static_frames, static_windows
+
+# Rendering engines of `create_video`
+BACKENDS = ("moviepy", "segments", "ffmpeg")
+# Seconds of the fade in and fade out of every scene
+FADE_DURATION = 1
+
+import _paths  # noqa: F401, adds diffusion/scripts to the import path
+from script_model import iter_audio, load_script, read_header
+from profiling import add_span, reset, save_profile, span
 
 
 def get_files(folder, extensions):
@@ -37,14 +60,9 @@ def get_files(folder, extensions):
         folder (str): Path to the folder.
         extensions (tuple): File extensions to include (e.g., ('.jpg', '.png')).
     Returns:
-        list: List of file paths.
+        list: List of file paths, in natural order (`2.jpg` before `10.jpg`).
     """
-    return [
-        os.path.join(folder, file)
-        # Files are numbered , so that after sorting they are compiled into the video in that order.
-        for file in sorted(os.listdir(folder))  
-        if file.lower().endswith(extensions)
-    ]
+    return scan_folder(folder, extensions)
     
 
 
@@ -100,78 +118,30 @@ def create_srt(text :str,
 def extract_topic_from_json(file_path):
     '''
     extract_topic_from_json extract() takes json file path as input.
-    - Opens the file as read-only and loads the JSON data from it.
-    - Extracts the topic from the JSON data.
-
-    On success, it returns the topic of the video.
+    Reads the header of the script with `read_header` and returns the topic of the video, the segments are not loaded.
+    Raises FileNotFoundError or ScriptError if the script is missing or invalid.
     '''
-    try:
-        # Open the JSON file
-        with open(file_path, 'r') as file:
-            # Load JSON data from the file
-            data = json.load(file)
-            
-            # Extract the topic, and audio_script from the JSON data
-            topic = data.get('topic', 'No topic found')
-            
-            return topic
-    except FileNotFoundError:
-        print(f"Error: The file {file_path} was not found.")
-    except json.JSONDecodeError:
-        print(f"Error: The file {file_path} contains invalid JSON.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    return read_header(file_path)["topic"]
 
 
 def extract_audio_from_json(file_path):
     '''
     extract_audio_topic_from_json() takes json file path as input.
-    - Opens the file as read-only and loads the JSON data from it.
-    - Extracts the audio_script from the JSON data.
-
-    On success, it returns audio_script.
+    Returns an iterator over the audio segments of the script (`AudioSegment` objects), parsed lazily by `iter_audio`.
+    Raises FileNotFoundError or ScriptError while iterating if the script is missing or invalid.
     '''
-    try:
-        # Open the JSON file
-        with open(file_path, 'r') as file:
-            # Load JSON data from the file
-            data = json.load(file)
-            
-            # Extract the topic, audio_script and visual_script
-            topic = data.get('topic', 'No topic found')
-            audio_script = data.get('audio_script', [])
-            # visual_script = data.get('visual_script', [])
-
-            return audio_script
-    except FileNotFoundError:
-        print(f"Error: The file {file_path} was not found.")
-    except json.JSONDecodeError:
-        print(f"Error: The file {file_path} contains invalid JSON.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    return iter_audio(file_path)
 
 
 def json_extract(json_path):
     '''
     json_extract() takes json file path as input.
-    - Calls the extract_audio_from_json() to extract the text-to-speech / subtitles from the json file,
-    and the topic of the video.
-
-    On success, it returns the subtitles in list format, and the topic.
+    Streams the audio segments of the script and returns the subtitles in list format.
     '''
-    
-    # Extract parameters from json file
-    audio_script = extract_audio_from_json(json_path)
-    if audio_script:
-        # print("Extracted Audio Parameters:")
-        audio_data = []
-        for item in audio_script:
-            if 'text' in item:
-                text = item['text']
-                audio_data.append(text)
-        return audio_data
-    else:
+    subtitles = [segment.text for segment in extract_audio_from_json(json_path)]
+    if not subtitles:
         raise FileNotFoundError("No audio script found in the JSON file.")
+    return subtitles
     
 
 def add_effects(clip):
@@ -182,11 +152,32 @@ def add_effects(clip):
     Returns:
         VideoClip: Video clip with one effect applied.
     """
-    random_effect =[vfx.FadeIn(duration=1),vfx.FadeOut(duration=1)]    
+    random_effect =[vfx.FadeIn(duration=FADE_DURATION),vfx.FadeOut(duration=FADE_DURATION)]    
     # print(random_effect)
     return clip.with_effects(random_effect)
 
 
+def time_frames(clip):
+    """
+    Measures the time spent computing the frames of a clip (compositing, subtitle overlay), which MoviePy otherwise
+    mixes with the encoding time inside `write_videofile`.
+    Parameters:
+        clip (VideoClip): Clip whose frames are timed.
+    Returns:
+        tuple: (timed clip, dict with the total "wall" time and the number of "frames" computed so far).
+    """
+    stats = {"wall": 0.0, "frames": 0}
+
+    def timed(get_frame, t):
+        start = time.perf_counter()
+        frame = get_frame(t)
+        stats["wall"] += time.perf_counter() - start
+        stats["frames"] += 1
+        return frame
+
+    return clip.transform(timed), stats
+
+
 def create_intro_clip(background_image_path, 
                       duration, 
                       topic,
@@ -195,7 +186,7 @@ def create_intro_clip(background_image_path,
     Create an intro video clip with a background image and centered text.
 
     Parameters:
-        background_image_path (str): Path to the background image.
+        background_image_path (str): Path to the background image, or the image as an array.
         duration (int or float): Duration of the clip in seconds.
         topic (str): The text to display. Defaults to "Welcome to My Video!".
         font_path (str): Path to the TrueType font file.
@@ -228,7 +219,18 @@ def create_video(image_folder :str,
                 script_path : str,
                 font_path : str ,
                 output_file : str,
-                with_subtitles :bool = False):
+                with_subtitles :bool = False,
+                fast_stills :bool = False,
+                workers :int = 1,
+                cache_dir :str = None,
+                manifest_path :str = None,
+                srt_output :str = None,
+                profile_path :str = None,
+                profile :str = "still",
+                min_fps :float = None,
+                resolution :tuple = None,
+                memory_budget :int = 256 * 1024**2,
+                backend :str = "moviepy"):
     """
     Main function that creates the video. The function works in 3 parts:
     1. Checks if the given parameters are correct.
@@ -236,8 +238,9 @@ def create_video(image_folder :str,
     Each image is displayed with the same duration as the corresponding audio file.
     3. if the `with_subtitle` flag is set to `True` embeds subtitles within the video itself, cannot be turned off in video players.
     
-    Video is compiled using the `compose` method so that if the images are of different aspect ratios /resolutions then the video takes 
-    the image with the largest resolution or aspect ratio as the default one and puts black bars with the rest of the non-fitting images
+    Every image is resized and letterboxed once to the resolution of the video by `ImagePrep` before rendering, so that
+    images of different aspect ratios / resolutions get black bars and every frame has the same size. By default the
+    video takes the largest width and height among the images.
     Args:
         image_folder (str) : Path to the folder containing images.
         audio_folder (str) : Path to the folder containing audio files.
@@ -245,126 +248,241 @@ def create_video(image_folder :str,
         font_path (str)    : Path to of the Font File, must be a True type or an Open Type Font
         output_file (str)  : Name of the output video file.
         with_subtitles (bool) : When set to true embeds the subtitles in the video.
+        fast_stills (bool) : When set to true every clip is rendered as a separate segment by `still_segments`, image only
+        clips are encoded straight by ffmpeg and the segments are joined without re-encoding.
+        workers (int) : Number of segments rendered in parallel by separate processes, only used with `fast_stills`.
+        cache_dir (str) : Folder of the segment cache, only used with `fast_stills`. Clips that didn't change since the
+        last render are reused from the cache instead of being encoded again.
+        manifest_path (str) : Path to the `manifest.json` written by the audio stage. When given, clip durations and
+        subtitle timings are computed from the exact sample counts of the manifest instead of decoding the audio files.
+        srt_output (str) : When given, the `.srt` file is written to this path in the same run, from the same subtitle
+        timeline as the burnt-in subtitles.
+        profile_path (str) : When given, the time, CPU, memory and frame rate of every stage are saved to this JSON
+        file, with a Chrome trace next to it (see `diffusion/scripts/profiling.py`).
+        profile (str) : Encoding profile, `still`, `default` or `draft` (see `encoding_profiles.py`). The codecs are
+        picked from the extension of `output_file`.
+        min_fps (float) : When given, the video is written with a variable frame rate: frames are only composited and
+        encoded when the picture changes (fades, subtitle changes, scene cuts), held stills keep `min_fps` frames per
+        second. See `vfr.py`.
+        resolution (tuple) : (width, height) of the video, the largest image size by default. The normalised images
+        are cached in `cache_dir/frames` when `cache_dir` is given.
+        memory_budget (int) : Maximum number of bytes of decoded images held at the same time. Images and audio files
+        are only opened while their scene is rendered and released right after, see `lazy_clips.py`.
+        backend (str) : `moviepy` composites every frame with MoviePy, `segments` is the same as `fast_stills=True`,
+        `ffmpeg` compiles the whole video into a single ffmpeg filter graph (see `ffmpeg_backend.py`).
     Raises:
+        ValueError: If the backend is not known.
         FileNotFoundError: If images, audio or subtitles are not detected.
+        MissingAssetsError: If some scenes of the script have no image or audio file, before anything is rendered.
     """
 
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', use one of {', '.join(BACKENDS)}")
+    # The profile only covers this render, not the earlier ones of the same process
+    reset()
+    manifest = AudioManifest.load(manifest_path) if manifest_path else None
+    # The script is parsed once. Every scene is paired with its image and audio file by scene id and missing assets are
+    # reported here, before anything is rendered.
+    script = load_script(script_path)
+    scenes = resolve_assets(script, image_folder, audio_folder, manifest)
+    images = [scene.image for scene in scenes]
+    audio_files = [scene.audio for scene in scenes]
+    subtitles = [scene.subtitle for scene in scenes]
+    raw_clips = []
+    # Fade of every clip of raw_clips, the picture of a clip only changes during its fades
+    fades = []
+    audio_durations = []
+    Start_duration = 0
+    
+    #creating the intro clip and appending it to raw clips
+    path_to_background = "Samples/Intro/intro.jpg"
+    font_path = "Samples/font/font.ttf"
+    topic = script.topic
+    # Every image is decoded, resized and letterboxed once to the video resolution, see `image_prep.py`
+    frames = ImagePrep(resolution or canvas_size(images + [path_to_background]),
+                       os.path.join(cache_dir, "frames") if cache_dir else None)
+    if fast_stills or backend != "moviepy":
+        try:
+            with span("assembly.image_prep", frames=len(images) + 1):
+                images = frames.paths(images)
+                path_to_background = frames.path(path_to_background)
+            create_segmented_video(images, audio_files, subtitles, topic, path_to_background, font_path,
+                                   output_file, with_subtitles, workers=workers, cache_dir=cache_dir,
+                                   manifest=manifest, srt_output=srt_output, profile=profile, min_fps=min_fps,
+                                   backend="ffmpeg" if backend == "ffmpeg" else "segments")
+        finally:
+            frames.close()
+        save_profile(profile_path)
+        return
+    intro_clip = create_intro_clip(frames.frame(path_to_background), duration=5, topic=topic, font_path=font_path)
+    raw_clips.append(intro_clip)
+    fades.append(0)
+    
+    # Create different clips with audio. Only the durations are read here, the image and the audio file of a scene
+    # are opened while it is rendered and released once the next scene starts.
+    durations = [manifest.duration(n) for n in range(len(images))] if manifest else read_audio_durations(audio_files)
+    media = MediaPool(memory_budget)
+    for n, (img, audio) in enumerate(zip(images,audio_files)):
+        with span("assembly.clip", index=n):
+            duration = durations[n]
+            start = intro_clip.duration + Start_duration
+            image_clip = media.image_clip(lambda img=img: frames.frame(img), frames.size, start, duration)
+            image_clip = image_clip.with_audio(media.audio_clip(audio, start, duration))
+        # Debug Text for subtitle synchronisation:
+        # print(f"Start : {Start_duration}")
+        # print(f"End : {duration+Start_duration}")
+        audio_durations.append(duration)
+        print(f"Video Clip no. {n+1} successfully created")
+        Start_duration += duration
+        image_clip = add_effects(image_clip)
+        raw_clips.append(image_clip)
+        fades.append(FADE_DURATION)
+    
+    # Add a small a pause blank audio file that adds itself to every audioclip
+    
+    
+    #creating the outro clip appending it to raw clips  
+    outro_text = "Thank you for watching! Made by ForgeTube team."
+    outro_clip = create_intro_clip(frames.frame(path_to_background), duration=5, topic=outro_text, font_path=font_path)
+    raw_clips.append(outro_clip)
+    fades.append(0)
+    #     Store individual clips without subtitles for preview / debug 
+    #     clip = None
+    #     clip = CompositeVideoClip(img)
+    #     clip.write_videofile(f"samples/raw/{raw_clips.index(image_clip)+1}.mp4",fps = 1,threads = os.cpu_count())
+    
+    # Same as concatenate_videoclips(raw_clips, method="compose"), but each frame only composites the active clip.
+    video = concatenate_indexed(raw_clips)
+    
+    '''
+    The following part of the code fixes all the below mentioned issues and their following fixes :
+    FIXME: 1. Subtitles are not properly synchronised with the audio.
+    FIX: Each subtitle text is paired with the corresponding audio. Duration of the text is kept same as the duration of the audio.
+    FIXME: 2. If the entire text is shown at once, then it doesn't fit.
+    FIX: Allows a maximum number of 10 words to be shown at once, rest of the text is divided into chunks, each chunk is set to an
+    equivalent duration.
+    Where duration of the chunk = Total duration of the audio * (Chunk_Size / Total Number of words)
+    WARNING: Due to some rounding errors and division errors with floats, some chunks are not perfectly synchronised.         
+    FIX: Chunk boundaries are computed from the start of their audio clip so errors don't add up, in integer samples
+    with an audio manifest, and taken from the word timings reported by the TTS pipeline when they are available.
+    See `SubtitleTimeline`.
+    FIXME 3. Subtitles do not appear at the right position in the video. Preferable position is Vertical : bottom, Horizontal = Center,
+    FIX : `SubtitleClip` was causing problems so, used `TextClip` instead.
+    FIXME 4. When subtitles were added to each clip one by one, and all clips later concatenated, an error occurred if images were 
+    of different dimensions, where the aspect ratio of the final video was messed up.
+    FIX: Make it such that concatenation is done only on the image clips and composite video clip is added later on with the 
+    FIXME 5. One TextClip layer per chunk made every frame go through all the subtitle clips of the video.
+    FIX: Subtitles are burnt in by `SubtitleOverlay`, which renders each chunk once and only blits the active one.
+    '''
+    # Subtitle cues are computed once and shared by the .srt file and the burnt-in subtitles.
+    timeline = SubtitleTimeline(subtitles, audio_durations, manifest, offset=5)
+    if srt_output:
+        timeline.write_srt(srt_output)
+    if with_subtitles == True:
+        # Each distinct chunk is rasterised once and blitted by a single overlay, instead of one TextClip layer
+        # per chunk that the composite has to go through on every frame.
+        final_video = SubtitleOverlay(timeline.cues, font_path).apply_to(video)
+    else:
+        final_video = video
+    final_video, composite_stats = time_frames(final_video)
+    settings = encoder_settings(output_file, profile, fps=24, min_fps=min_fps)
+    if settings.variable_frame_rate:
+        # Placement of the clips in the concatenation, intro and outro are held titles
+        clip_times = [(clip.start, clip.duration, fade) for clip, fade in zip(video.clips, fades)]
+        windows = static_windows(clip_times, timeline.cues if with_subtitles else ())
+        final_video, _ = hold_static_frames(final_video, windows)
     try:
-        images = get_files(image_folder, ('.jpg', '.png'))
-        audio_files = get_files(audio_folder, ('.mp3', '.wav'))
-        subtitles = json_extract(script_path)
-        raw_clips = []
-        audio_durations = []
-        Start_duration = 0
-        
-        #creating the intro clip and appending it to raw clips
-        path_to_background = "Samples/Intro/intro.jpg"
-        font_path = "Samples/font/font.ttf"
-        topic = extract_topic_from_json(script_path)
-        intro_clip = create_intro_clip(path_to_background, duration=5, topic=topic, font_path=font_path)
-        raw_clips.append(intro_clip)
-        
-        # Create different clips with audio
-        for img, audio in zip(images,audio_files):
-            audio_clip = AudioFileClip(audio)
-            image_clip = ImageClip(img).with_duration(audio_clip.duration).with_audio(audio_clip)
-            # Debug Text for subtitle synchronisation:
-            # print(f"Start : {Start_duration}")
-            # print(f"End : {audio_clip.duration+Start_duration}")
-            audio_durations.append(audio_clip.duration)
-            print(f"Video Clip no. {images.index(img)+1} successfully created")
-            Start_duration += audio_clip.duration
-            image_clip = add_effects(image_clip)
-            raw_clips.append(image_clip)            
-        
-        # Add a small a pause blank audio file that adds itself to every audioclip
-        
-        
-        #creating the outro clip appending it to raw clips  
-        outro_text = "Thank you for watching! Made by ForgeTube team."
-        outro_clip = create_intro_clip(path_to_background, duration=5, topic=outro_text, font_path=font_path)
-        raw_clips.append(outro_clip)
-        #     Store individual clips without subtitles for preview / debug 
-        #     clip = None
-        #     clip = CompositeVideoClip(img)
-        #     clip.write_videofile(f"samples/raw/{raw_clips.index(image_clip)+1}.mp4",fps = 1,threads = os.cpu_count())
-        
-        video = concatenate_videoclips(raw_clips, method="compose")
-        
-        '''
-        The following part of the code fixes all the below mentioned issues and their following fixes :
-        FIXME: 1. Subtitles are not properly synchronised with the audio.
-        FIX: Each subtitle text is paired with the corresponding audio. Duration of the text is kept same as the duration of the audio.
-        FIXME: 2. If the entire text is shown at once, then it doesn't fit.
-        FIX: Allows a maximum number of 10 words to be shown at once, rest of the text is divided into chunks, each chunk is set to an
-        equivalent duration.
-        Where duration of the chunk = Total duration of the audio * (Chunk_Size / Total Number of words)
-        WARNING: Due to some rounding errors and division errors with floats, some chunks are not perfectly synchronised.         
-        FIXME 3. Subtitles do not appear at the right position in the video. Preferable position is Vertical : bottom, Horizontal = Center,
-        FIX : `SubtitleClip` was causing problems so, used `TextClip` instead.
-        FIXME 4. When subtitles were added to each clip one by one, and all clips later concatenated, an error occurred if images were 
-        of different dimensions, where the aspect ratio of the final video was messed up.
-        FIX: Make it such that concatenation is done only on the image clips and composite video clip is added later on with the 
-        '''
-        if with_subtitles == True:
-            Start_duration = 5
-            subtitle_clips = []
-            chunk = ''
-            chunks = []
-            chunk_duration = 0
-            chunk_durations = []
-            chunk_size = 10
-            for text,duration in zip(subtitles,audio_durations):
-                words = text.split()
-                if len(words) > chunk_size:
-                    for i in range(0,len(words),chunk_size):
-                        chunk = " ".join(words[i : (i+chunk_size if i < len(words)-1 else len(words)-1)])
-                        chunks.append(chunk)
-                        chunk_duration = duration * (len(chunk.split())/len(words))
-                        chunk_durations.append(chunk_duration)
-                else:
-                    chunks.append(text)
-                    chunk_durations.append(duration)
-            # For Debugging:
-            # for i in chunks:
-                # print(f"Index :{chunks.index(i)}, Text: {i}, Word Count: {len(i.split())}")
-            # print(chunk_durations)
-            for subtitle,duration in zip(chunks,chunk_durations):
-                subtitle_clip=TextClip(text=subtitle,
-                                        font=font_path, 
-                                        color='white', 
-                                        bg_color='black', 
-                                        size=(1000, 100),
-                                        method='caption',
-                                        text_align = "center",
-                                        horizontal_align = "center"
-                                        ).with_duration(duration).with_start(Start_duration).with_position('bottom')
-                subtitle_clips.append(subtitle_clip)
-                # For Debugging :
-                # print(f"Subtitle Clip no. {chunks.index(subtitle)+1} successfully created")
-                Start_duration += duration
-            subtitle_clips.insert(0,video)
-            final_video = CompositeVideoClip(subtitle_clips)
-        else:
-            final_video = video
-        final_video.write_videofile(output_file, fps=24,threads = os.cpu_count())
+        with span("assembly.encode", frames=round(final_video.duration * 24)):
+            final_video.write_videofile(output_file, fps=24,threads = os.cpu_count(), **settings.moviepy_args())
+    finally:
+        # The lazy clips load their frames from `frames` while the video is written, both are released only once the
+        # encode is done, or has failed
+        media.close()
+        frames.close()
+    # Part of the encode span, frames are composited on demand while MoviePy feeds the encoder
+    add_span("assembly.composite", composite_stats["wall"], frames=composite_stats["frames"])
+    print(f"Peak media memory: {media.peak_bytes / 1024**2:.0f} MB of images, {media.peak_readers} audio readers")
+    print(f"Video created successfully: {output_file}")
+    save_profile(profile_path)
+
+
+def create_segmented_video(images, audio_files, subtitles, topic, background_image_path, font_path, output_file,
+                           with_subtitles=False, outro_text="Thank you for watching! Made by ForgeTube team.",
+                           workers=1, cache_dir=None, manifest=None, srt_output=None, profile="still",
+                           min_fps=None, backend="segments"):
+    """
+    Fast path of `create_video`. Every clip of the video (intro, one clip per image / audio pair, outro) is described
+    as a `SegmentSpec` and rendered on its own by `still_segments`:
+    image only clips are encoded straight by ffmpeg from a looped image, only the clips with text go through MoviePy.
+    The segments are then joined with ffmpeg's concat demuxer without re-encoding.
+    With the `ffmpeg` backend, the same segments are compiled into a single filter graph instead, text included.
+    Parameters:
+        images (list): Paths of the images, in playback order.
+        audio_files (list): Paths of the audio files, in playback order.
+        subtitles (list): Subtitle text of every audio file.
+        topic (str): Title shown in the intro clip.
+        background_image_path (str): Background image of the intro and outro clips.
+        font_path (str): Path to of the Font File, must be a True type or an Open Type Font
+        output_file (str): Name of the output video file.
+        with_subtitles (bool): When set to true embeds the subtitles in the video.
+        outro_text (str): Text shown in the outro clip.
+        workers (int): Number of segments rendered in parallel, each in its own process.
+        cache_dir (str): Folder of the segment cache, `None` disables caching.
+        manifest (AudioManifest): Timing manifest of the audio stage, used instead of decoding the audio files.
+        srt_output (str): When given, the `.srt` file is written to this path from the same subtitle timeline.
+        profile (str): Encoding profile of the segments, see `encoding_profiles.py`.
+        min_fps (float): `None` for a constant frame rate, otherwise the frame rate of held stills, see `vfr.py`.
+        backend (str): `segments` for the still segment engine, `ffmpeg` for a single filter graph. The segment cache
+        and the workers are only used by the still segment engine.
+    """
+    scenes = list(zip(images, audio_files, subtitles))
+    if manifest:
+        durations = [manifest.duration(n) for n in range(len(scenes))]
+    else:
+        durations = read_audio_durations([audio for _, audio, _ in scenes])
+    timeline = SubtitleTimeline(subtitles, durations, manifest, offset=5)
+    if srt_output:
+        timeline.write_srt(srt_output)
+
+    specs = [SegmentSpec(image=background_image_path, duration=5, title=topic, fade=0)]
+    for n, (img, audio, text) in enumerate(scenes):
+        cues = timeline.scene_cues(n) if with_subtitles else []
+        specs.append(SegmentSpec(image=img, duration=durations[n], audio=audio, subtitles=cues))
+    specs.append(SegmentSpec(image=background_image_path, duration=5, title=outro_text, fade=0))
+    if backend == "ffmpeg":
+        render_filter_graph(specs, output_file, font_path, canvas_size([spec.image for spec in specs]), fps=24,
+                            profile=profile, min_fps=min_fps)
         print(f"Video created successfully: {output_file}")
+        return
+    cache = SegmentCache(cache_dir) if cache_dir else None
+    render_segmented_video(specs, output_file, font_path, fps=24, workers=workers, cache=cache, profile=profile,
+                           min_fps=min_fps)
+    print(f"Video created successfully: {output_file}")
+
         
-    except FileNotFoundError:
-        if not images:
-            raise FileNotFoundError("No images found in the specified folder.")
-        if not audio_files:
-            raise FileNotFoundError("No audio files found in the specified folder.")
-        if not subtitles:
-            raise FileNotFoundError("No subtitles found in the specified json. ")
-        
-        
+def read_audio_durations(audio_files):
+    """
+    Reads the duration of every audio file, closing each reader right away.
+    Parameters:
+        audio_files (list): Paths of the audio files.
+    Returns:
+        list: Durations in seconds.
+    """
+    durations = []
+    for audio in audio_files:
+        audio_clip = AudioFileClip(audio)
+        durations.append(audio_clip.duration)
+        audio_clip.close()
+    return durations
+
+
 def create_complete_srt(script_folder :str, 
             audio_file_folder : str, 
             outfile_path:str,
-            chunk_size=10):
+            chunk_size=10,
+            manifest_path:str = None):
     """
-    Creates an SRT file by extracting subtitles from the script_folder using `json_extract` function and audio files 
+    Creates an SRT file by extracting subtitles from the script_folder with `load_script` and audio files 
     from the `audio_file` folder. Segments the subtitles into the specified chunk size and maps the duration of the chunk to the 
     proportion of the length of the chunk.
     Parameters:
@@ -372,59 +490,22 @@ def create_complete_srt(script_folder :str,
     audio_file_folder (str): Path to the folder containing audio files.
     outfile_path (str): Path or Name of the SRT file given in output.
     chunk_size (str): Number of words per subtitle chunk.
+    manifest_path (str): Path to the `manifest.json` written by the audio stage. When given, timings are computed in
+    integer samples from the manifest and no audio file is opened.
     """
     
-    script = json_extract(script_folder)
-    audio_files = get_files(audio_file_folder,(".wav",".mp3"))
-    audio_clips = []
-    [audio_clips.append(AudioFileClip(x)) for x in audio_files]
-    subs = pysrt.SubRipFile()
-    start_time = 5 
-    chunk = ''
-    chunk_duration = 0
-    end_time = 5
-    n = 1
-    for text,audio_clip in zip(script,audio_clips):
-        duration = audio_clip.duration
-        words = text.split()
-        if len(words) > chunk_size:
-            for i in range(0,len(words),chunk_size):
-                chunk = " ".join(words[i : (i+chunk_size if i < len(words)-1 else len(words)-1)])
-                chunk_duration = duration * (len(chunk.split())/len(words))
-                end_time += chunk_duration
-                subtitle = pysrt.SubRipItem(
-                    index=n,
-                    start=pysrt.SubRipTime(seconds=start_time),
-                    end=pysrt.SubRipTime(seconds=end_time),
-                    text=chunk
-                )
-                subs.append(subtitle)
-                # For Debugging:
-                # print(f"Subtitle no. {n} added successfully.")
-                # print(f"Start : {start_time}")
-                # print(f"End : {end_time}")
-                start_time = end_time
-                n+=1
-        else:
-            chunk = text
-            chunk_duration = duration
-            end_time += chunk_duration
-            subtitle = pysrt.SubRipItem(
-                index=len(subs) + 1,
-                start=pysrt.SubRipTime(seconds=start_time),
-                end=pysrt.SubRipTime(seconds=end_time),
-                text=chunk
-            )
-            subs.append(subtitle)
-            # For Debugging:
-            # print(f"Subtitle no. {n} added successfully.")
-            # print(f"Start : {start_time}")
-            # print(f"End : {end_time}")
-            start_time = end_time
-            n+=1
-            
-    subs.save(outfile_path)
-    print(f"File saved successfully at {outfile_path}")
+    # Parsed once, for the subtitles and for pairing the audio files with the scenes
+    script = load_script(script_folder)
+    if not script.subtitles:
+        raise FileNotFoundError("No audio script found in the JSON file.")
+    if manifest_path:
+        timeline = SubtitleTimeline(script.subtitles, manifest=AudioManifest.load(manifest_path), offset=5,
+                                    chunk_size=chunk_size)
+    else:
+        durations = read_audio_durations([scene.audio for scene in resolve_assets(script,
+                                                                                  audio_folder=audio_file_folder)])
+        timeline = SubtitleTimeline(script.subtitles, durations, offset=5, chunk_size=chunk_size)
+    timeline.write_srt(outfile_path)
 
         
 if __name__ == "__main__":
@@ -433,13 +514,9 @@ if __name__ == "__main__":
     script_path = "Samples/templates/" 
     font_path = "Samples/font/font.ttf"
     sub_output_file = "samples/subtitles/.srt/"
-    topic = extract_topic_from_json(script_path)
     output_file = f"Samples/Videos/.mp4"
     
-    create_complete_srt(script_folder=script_path,
-                        audio_file_folder=audio_folder,
-                        outfile_path=sub_output_file,
-                        chunk_size = 10)
-    
-    create_video(image_folder, audio_folder,script_path,font_path, output_file,with_subtitles=True)
+    # The .srt file and the burnt-in subtitles come from the same subtitle timeline, in one run.
+    create_video(image_folder, audio_folder,script_path,font_path, output_file,with_subtitles=True,
+                 srt_output=sub_output_file)
     
@@ -0,0 +1,183 @@
+'''
+README : Asset resolver of the video assembler.
+
+The assembler used to list the image and audio folders, sort them alphabetically and `zip` them together, so `10.jpg`
+came before `2.jpg`, the `scene_{timestamp}.png` images written by `generate_image.py` were paired by luck, and a missing
+file silently dropped the end of the video.
+`resolve_assets` pairs every scene of the script with its image and audio file by scene id instead:
+- `scene_{scene_id}.png` (images of `generate_image.py`) is matched with the `scene_id` of the visual segment,
+- `segment_{n}.wav` (audio of `generate_audio.py`) is matched with the scene at index `n`, counted from 0,
+- numbered files `1.jpg`, `2.mp3`, ... are matched with the scene of that number, counted from 1,
+- the files whose name carries no scene id are matched by their position in natural order.
+Every folder is scanned once with `os.scandir`, and every scene is checked before anything is rendered: if an asset is
+missing, `MissingAssetsError` lists all of them at once.
+'''
+import os
+import re
+from dataclasses import dataclass
+
+import _paths  # noqa: F401, adds diffusion/scripts to the import path
+from script_model import load_script
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+AUDIO_EXTENSIONS = ('.mp3', '.wav')
+
+_SCENE_NAME = re.compile(r"^scene_(.+)$", re.IGNORECASE)
+_SEGMENT_NAME = re.compile(r"^segment_(\d+)$", re.IGNORECASE)
+
+
+class MissingAssetsError(FileNotFoundError):
+    pass
+
+
+def natural_key(name):
+    """
+    Sort key that orders the numbers in a file name by value, `2.jpg` before `10.jpg`.
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def scan_folder(folder, extensions):
+    """
+    Lists the files of a folder with one of the given extensions, in natural order.
+    Parameters:
+        folder (str): Path to the folder.
+        extensions (tuple): File extensions to include (e.g., ('.jpg', '.png')).
+    Returns:
+        list: List of file paths.
+    """
+    with os.scandir(folder) as listing:
+        names = [entry.name for entry in listing if entry.is_file() and entry.name.lower().endswith(extensions)]
+    return [os.path.join(folder, name) for name in sorted(names, key=natural_key)]
+
+
+class AssetFolder:
+    """
+    Files of one asset folder, indexed by the scene they belong to.
+    Parameters:
+        folder (str): Path to the folder.
+        extensions (tuple): File extensions of the assets.
+    Raises:
+        ValueError: If two files claim the same scene, e.g. `1.jpg` and `1.png`.
+    """
+
+    def __init__(self, folder, extensions):
+        self.folder = folder
+        self.files = scan_folder(folder, extensions)
+        self.by_key = {}
+        self.unnamed = []
+        for path in self.files:
+            key = self._key(os.path.splitext(os.path.basename(path))[0])
+            if key is None:
+                self.unnamed.append(path)
+            elif key in self.by_key:
+                raise ValueError(f"{self.by_key[key]} and {path} are both assets of the same scene")
+            else:
+                self.by_key[key] = path
+        self.used = set()
+
+    @staticmethod
+    def _key(stem):
+        match = _SCENE_NAME.match(stem)
+        if match:
+            return ("id", match.group(1))
+        match = _SEGMENT_NAME.match(stem)
+        if match:
+            return ("index", int(match.group(1)))
+        if stem.isdigit() and int(stem) > 0:
+            return ("index", int(stem) - 1)
+        return None
+
+    def find(self, n, scene_id=None):
+        """
+        Finds the asset of scene `n` (counted from 0), by scene id first, then by number, then by position.
+        Returns:
+            str: Path of the asset, `None` if the folder has none for this scene.
+        """
+        path = self.by_key.get(("id", scene_id)) if scene_id else None
+        if path is None:
+            path = self.by_key.get(("index", n))
+        if path is None and n < len(self.unnamed):
+            path = self.unnamed[n]
+        if path is not None:
+            self.used.add(path)
+        return path
+
+    def unused(self):
+        """Files that were not matched with any scene."""
+        return [path for path in self.files if path not in self.used]
+
+
+@dataclass
+class SceneAssets:
+    """
+    Everything needed to render one scene of the video.
+    Parameters:
+        index (int): Position of the scene in the script, counted from 0.
+        subtitle (str): Narration text of the scene.
+        image (str): Path of the image, `None` if no image folder was resolved.
+        audio (str): Path of the audio file, `None` if no audio folder was resolved.
+    """
+    index: int
+    subtitle: str
+    image: str = None
+    audio: str = None
+
+
+def resolve_assets(script, image_folder=None, audio_folder=None, manifest=None):
+    """
+    Pairs every scene of the script with its image and audio file and checks that nothing is missing.
+    Scenes are the segments of the `audio_script`, the image of scene `n` is looked up with the `scene_id` of the
+    `n`-th segment of the `visual_script`.
+    Parameters:
+        script (Script or str): Script already loaded with `load_script`, or the path of a `.json` / `.jsonl` script.
+        image_folder (str): Folder of the images, `None` to skip images.
+        audio_folder (str): Folder of the audio files, `None` to skip audio.
+        manifest (AudioManifest): Timing manifest of the audio stage. When it lists the segment files, they are used
+        instead of searching the audio folder.
+    Returns:
+        list: `SceneAssets` of every scene, in playback order.
+    Raises:
+        FileNotFoundError: If the script has no subtitles, or a folder has no assets.
+        MissingAssetsError: If some scenes have no image or audio file, all of them are listed.
+    """
+    if isinstance(script, str):
+        script = load_script(script)
+    subtitles = script.subtitles
+    if not subtitles:
+        raise FileNotFoundError("No subtitles found in the specified json. ")
+    scene_ids = [segment.scene_id for segment in script.visual] if image_folder else []
+
+    images = AssetFolder(image_folder, IMAGE_EXTENSIONS) if image_folder else None
+    if images is not None and not images.files:
+        raise FileNotFoundError("No images found in the specified folder.")
+    manifest_files = manifest.files if manifest and all(manifest.files) else None
+    audio = AssetFolder(audio_folder, AUDIO_EXTENSIONS) if audio_folder and not manifest_files else None
+    if audio is not None and not audio.files:
+        raise FileNotFoundError("No audio files found in the specified folder.")
+
+    scenes = []
+    missing = []
+    for n, text in enumerate(subtitles):
+        scene = SceneAssets(n, text)
+        if images is not None:
+            scene_id = scene_ids[n] if n < len(scene_ids) else None
+            scene.image = images.find(n, scene_id)
+            if scene.image is None:
+                missing.append(f"image of scene {n + 1}" + (f" (scene_{scene_id})" if scene_id else ""))
+        if manifest_files:
+            scene.audio = manifest_files[n] if n < len(manifest_files) else None
+            if scene.audio is None:
+                missing.append(f"audio of scene {n + 1} (not in the audio manifest)")
+        elif audio is not None:
+            scene.audio = audio.find(n)
+            if scene.audio is None:
+                missing.append(f"audio of scene {n + 1}")
+        scenes.append(scene)
+    if missing:
+        raise MissingAssetsError("Missing assets: " + ", ".join(missing))
+
+    for folder in (images, audio):
+        if folder is not None and folder.unused():
+            print(f"Unused files in {folder.folder}: {[os.path.basename(path) for path in folder.unused()]}")
+    return scenes
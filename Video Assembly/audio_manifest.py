@@ -0,0 +1,133 @@
+'''
+README : Reader for the timing manifest written by the audio stage (`diffusion/scripts/generate_audio.py`).
+
+The manifest holds the sample rate of the narration and the exact sample count and start offset of every audio segment.
+With it, the assembler plans the whole timeline (clip durations, subtitle timings) in integer samples, without opening
+a single audio file, and only converts to seconds at the very end so that rounding errors never accumulate.
+When the TTS pipeline reports word timings, subtitle chunks are cut on the real word boundaries.
+
+Manifest format:
+{
+    "sample_rate": 24000,
+    "total_samples": 265200,
+    "segments": [{"index": 0, "file": "segment_0.wav", "start_sample": 0, "num_samples": 121200,
+                  "words": [{"text": "For", "start": 1200, "end": 4800}, ...]}, ...]
+}
+'''
+import json
+import os
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ManifestSegment:
+    """
+    One audio segment of the manifest.
+    Parameters:
+        index (int): Position of the segment in the `audio_script`.
+        file (str): Path of the segment audio file, `None` if the audio stage didn't write per-segment files.
+        start_sample (int): Offset of the segment in the merged narration, in samples.
+        num_samples (int): Exact length of the segment, in samples.
+        words (list): (text, start sample, end sample) of every spoken word, relative to the start of the segment.
+        Empty if the TTS pipeline didn't report timings.
+    """
+    index: int
+    file: str
+    start_sample: int
+    num_samples: int
+    words: list = field(default_factory=list)
+
+
+class AudioManifest:
+    """
+    Timing manifest of the narration.
+    Parameters:
+        sample_rate (int): Sample rate of every segment.
+        segments (list): `ManifestSegment` of every segment, in playback order.
+    """
+
+    def __init__(self, sample_rate, segments):
+        self.sample_rate = sample_rate
+        self.segments = segments
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a manifest written by `generate_audio.write_manifest`. Segment files are resolved relative to the folder
+        of the manifest.
+        Raises:
+            FileNotFoundError: If the manifest doesn't exist.
+            ValueError: If the manifest is malformed or its segments are not contiguous.
+        """
+        with open(path, "r") as file:
+            data = json.load(file)
+        folder = os.path.dirname(os.path.abspath(path))
+        try:
+            sample_rate = int(data["sample_rate"])
+            segments = [ManifestSegment(index=int(item["index"]),
+                                        file=os.path.join(folder, item["file"]) if item.get("file") else None,
+                                        start_sample=int(item["start_sample"]),
+                                        num_samples=int(item["num_samples"]),
+                                        words=[(word["text"], int(word["start"]), int(word["end"]))
+                                               for word in item.get("words", [])])
+                        for item in data["segments"]]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed audio manifest {path}: {e}") from e
+        expected_start = 0
+        for segment in segments:
+            if segment.start_sample != expected_start:
+                raise ValueError(f"Segment {segment.index} of {path} starts at sample {segment.start_sample}, "
+                                 f"expected {expected_start}")
+            expected_start += segment.num_samples
+        return cls(sample_rate, segments)
+
+    @property
+    def files(self):
+        """Paths of the segment audio files, in playback order."""
+        return [segment.file for segment in self.segments]
+
+    def seconds(self, samples):
+        """Converts a position in samples to seconds."""
+        return samples / self.sample_rate
+
+    def samples(self, seconds):
+        """Converts a position in seconds (e.g. the length of the intro clip) to samples."""
+        return round(seconds * self.sample_rate)
+
+    def duration(self, n):
+        """Exact duration of segment `n` in seconds."""
+        return self.seconds(self.segments[n].num_samples)
+
+    def cue_samples(self, n, text, chunk_size=10):
+        """
+        Splits the text of segment `n` into chunks of at most `chunk_size` words.
+        With word timings, a chunk starts when its first word is spoken and lasts until the next chunk starts (the last
+        one until its last word ends), and the chunk text is the spoken words.
+        Without them, the time of the segment is divided in proportion to the number of words, every boundary is
+        computed from the start of the segment in integer samples, so the chunks always add up to the exact length
+        of the segment.
+        Parameters:
+            n (int): Index of the segment.
+            text (str): Subtitle text of the segment.
+            chunk_size (int): Maximum number of words shown at once.
+        Returns:
+            list: (start sample, end sample, chunk text) tuples, relative to the start of the segment.
+        """
+        timed_words = self.segments[n].words
+        if timed_words:
+            groups = [timed_words[i:i + chunk_size] for i in range(0, len(timed_words), chunk_size)]
+            cues = []
+            for g, group in enumerate(groups):
+                end = groups[g + 1][0][1] if g + 1 < len(groups) else group[-1][2]
+                cues.append((group[0][1], max(end, group[0][1]), " ".join(word for word, _, _ in group)))
+            return cues
+
+        words = text.split()
+        num_samples = self.segments[n].num_samples
+        if not words:
+            return []
+        cues = []
+        for i in range(0, len(words), chunk_size):
+            end = min(i + chunk_size, len(words))
+            cues.append((num_samples * i // len(words), num_samples * end // len(words), " ".join(words[i:end])))
+        return cues
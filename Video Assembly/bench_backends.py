@@ -0,0 +1,66 @@
+'''
+Benchmark : wall-clock time of the `create_video` backends (`moviepy`, `segments`, `ffmpeg`) on the sample media of the
+repository, and PSNR of every output against the MoviePy one. A backend passes when its average PSNR is above the
+tolerance, the images are scaled and encoded by different code paths, the text bitmaps are the same. The benchmark
+fails (exit status 1) when a backend doesn't match.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_backends.py" [--subtitles] [--tolerance-db 30]
+'''
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from moviepy.config import FFMPEG_BINARY
+
+from bench_common import (SAMPLE_AUDIO, SAMPLE_FONT, SAMPLE_IMAGES, SAMPLE_SCRIPT, load_assembler, print_table,
+                          timed)
+
+
+def psnr(reference, candidate):
+    """
+    Average PSNR of the frames of `candidate` against those of `reference`, computed by ffmpeg's `psnr` filter.
+    Returns:
+        float: PSNR in dB, `inf` for identical videos.
+    """
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", reference, "-i", candidate,
+                             "-lavfi", "[0:v][1:v]psnr", "-f", "null", "-"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    match = re.search(r"PSNR .*average:(\S+)", result.stderr)
+    if match is None:
+        raise RuntimeError(f"No PSNR in the output of ffmpeg:\n{result.stderr}")
+    return float(match.group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subtitles", action="store_true", help="Embed subtitles in the video.")
+    parser.add_argument("--tolerance-db", type=float, default=30.0, help="Lowest average PSNR accepted.")
+    args = parser.parse_args()
+
+    assembler = load_assembler()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        outputs = {}
+        for backend in assembler.BACKENDS:
+            outputs[backend] = os.path.join(workdir, f"{backend}.mp4")
+            elapsed = timed(assembler.create_video, SAMPLE_IMAGES, SAMPLE_AUDIO, SAMPLE_SCRIPT, SAMPLE_FONT,
+                            outputs[backend], with_subtitles=args.subtitles, backend=backend)
+            results.append((backend, elapsed))
+        scores = {backend: psnr(outputs["moviepy"], path) for backend, path in outputs.items() if backend != "moviepy"}
+    baseline = results[0][1]
+    rows = []
+    for backend, elapsed in results:
+        score = scores.get(backend)
+        verdict = "reference" if score is None else ("ok" if score >= args.tolerance_db else "FAIL")
+        rows.append((backend, f"{elapsed:.2f} s", f"x{baseline / elapsed:.2f}",
+                     "-" if score is None else f"{score:.2f} dB", verdict))
+    print_table(("backend", "wall-clock", "speed-up", "PSNR", "match"), rows)
+    failed = [backend for backend, score in scores.items() if score < args.tolerance_db]
+    if failed:
+        sys.exit(f"FAIL: {', '.join(failed)} below {args.tolerance_db:.0f} dB against moviepy")
+
+if __name__ == "__main__":
+    main()
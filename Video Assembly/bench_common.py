@@ -0,0 +1,47 @@
+'''
+Helpers shared by the benchmark scripts of the video assembler.
+The benchmarks are meant to be run from the root of the repository, the same way as the assembler itself:
+    python "Video Assembly/bench_still_segments.py"
+'''
+import importlib.util
+import os
+import time
+
+ASSEMBLER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assembly_video v4.py")
+
+# Sample media shipped with the repository.
+SAMPLE_IMAGES = "Samples/Images/Deep Space"
+SAMPLE_AUDIO = "Samples/Audio/Deep Space"
+SAMPLE_SCRIPT = "Samples/templates/mock_script 4.json"
+SAMPLE_FONT = "Samples/font/font.ttf"
+
+
+def load_assembler():
+    """
+    Imports `assembly_video v4.py`, which can't be imported with a regular import statement because of the space in
+    its name.
+    Returns:
+        module: The assembler module.
+    """
+    spec = importlib.util.spec_from_file_location("assembly_video_v4", ASSEMBLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(function, *args, **kwargs):
+    """
+    Calls `function` and measures its wall-clock time.
+    Returns:
+        float: Elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def print_table(header, rows):
+    """Prints the benchmark results as an aligned table."""
+    widths = [max(len(str(x)) for x in column) for column in zip(header, *rows)]
+    for row in [header, *rows]:
+        print("  ".join(str(x).ljust(w) for x, w in zip(row, widths)))
@@ -0,0 +1,42 @@
+'''
+Benchmark : encode time and file size of every encoding profile (`encoding_profiles.py`) for every container, on the
+sample media of the repository. The video is rendered with the still segment fast path so that the numbers measure
+the encoder and not MoviePy's compositing.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_encoding.py" [--containers .mp4 .webm] [--profiles still draft] [--workers N]
+'''
+import argparse
+import os
+import tempfile
+
+from bench_common import (SAMPLE_AUDIO, SAMPLE_FONT, SAMPLE_IMAGES, SAMPLE_SCRIPT, load_assembler, print_table,
+                          timed)
+from encoding_profiles import CONTAINER_CODECS, PROFILES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--containers", nargs="+", default=[".mp4", ".webm", ".mkv"], choices=list(CONTAINER_CODECS),
+                        help="Extensions of the output files.")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES),
+                        help="Encoding profiles to compare.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Segments encoded at the same time.")
+    args = parser.parse_args()
+
+    assembler = load_assembler()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for extension in args.containers:
+            for profile in args.profiles:
+                output_file = os.path.join(workdir, f"{profile}{extension}")
+                elapsed = timed(assembler.create_video, SAMPLE_IMAGES, SAMPLE_AUDIO, SAMPLE_SCRIPT, SAMPLE_FONT,
+                                output_file, fast_stills=True, workers=args.workers, profile=profile)
+                video_codec, audio_codec, _ = CONTAINER_CODECS[extension]
+                results.append((extension, profile, f"{video_codec} / {audio_codec}", elapsed,
+                                os.path.getsize(output_file)))
+    print_table(("container", "profile", "codecs", "encode time", "size"),
+                [(extension, profile, codecs, f"{elapsed:.2f} s", f"{size / 1e6:.2f} MB")
+                 for extension, profile, codecs, elapsed, size in results])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+'''
+Benchmark : peak memory of `create_video` as the number of scenes grows. The sample media is repeated to build scripts
+of increasing length, every run is done in a fresh process that reports its own peak resident memory. Subtitles are
+burnt in, and every scene gets its own narration so that no subtitle bitmap is shared between scenes. With the lazy
+clips of `lazy_clips.py`, the bounded subtitle cache of `subtitle_overlay.py` and the shared opaque masks of
+`timeline.concatenate_indexed` the peak should stay flat, it used to grow by one decoded image, one subtitle bitmap and
+one full size mask per scene. The benchmark fails
+(exit status 1) when the peak of the longest script exceeds the peak of the shortest one by more than `--max-growth-mb`.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_memory.py" [--scenes 5 20 80] [--memory-budget-mb 256] [--max-growth-mb 64]
+'''
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from bench_common import (SAMPLE_AUDIO, SAMPLE_FONT, SAMPLE_IMAGES, SAMPLE_SCRIPT, load_assembler, print_table,
+                          timed)
+from assets import AUDIO_EXTENSIONS, IMAGE_EXTENSIONS, scan_folder
+
+
+def build_sample(folder, scenes):
+    """
+    Writes a script of `scenes` scenes and links the sample images and audio files to it, cycling through them.
+    Returns:
+        tuple: (image folder, audio folder, script path).
+    """
+    with open(SAMPLE_SCRIPT) as f:
+        sample = json.load(f)
+    images = scan_folder(SAMPLE_IMAGES, IMAGE_EXTENSIONS)
+    audio = scan_folder(SAMPLE_AUDIO, AUDIO_EXTENSIONS)
+    image_folder = os.path.join(folder, "images")
+    audio_folder = os.path.join(folder, "audio")
+    os.makedirs(image_folder)
+    os.makedirs(audio_folder)
+    script = {"topic": sample["topic"], "audio_script": [], "visual_script": []}
+    for n in range(scenes):
+        k = n % len(sample["audio_script"])
+        script["audio_script"].append(dict(sample["audio_script"][k],
+                                           text=f"{sample['audio_script'][k]['text']} (part {n + 1})"))
+        script["visual_script"].append(sample["visual_script"][k])
+        image, sound = images[n % len(images)], audio[n % len(audio)]
+        os.symlink(os.path.abspath(image), os.path.join(image_folder, f"{n + 1}{os.path.splitext(image)[1]}"))
+        os.symlink(os.path.abspath(sound), os.path.join(audio_folder, f"{n + 1}{os.path.splitext(sound)[1]}"))
+    script_path = os.path.join(folder, "script.json")
+    with open(script_path, "w") as f:
+        json.dump(script, f)
+    return image_folder, audio_folder, script_path
+
+
+def run_child(args):
+    # Runs in its own process so that the peak resident memory only covers this render
+    with tempfile.TemporaryDirectory() as workdir:
+        image_folder, audio_folder, script_path = build_sample(workdir, args.child)
+        output_file = os.path.join(workdir, "video.mp4")
+        elapsed = timed(load_assembler().create_video, image_folder, audio_folder, script_path, SAMPLE_FONT,
+                        output_file, with_subtitles=True, profile="draft", resolution=tuple(args.resolution),
+                        memory_budget=args.memory_budget_mb * 1024**2)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024**2 if sys.platform == "darwin" else 1024
+    print(json.dumps({"wall": elapsed, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, nargs="+", default=[5, 20, 80], help="Scene counts to render.")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[1280, 720], help="Width and height of the video.")
+    parser.add_argument("--memory-budget-mb", type=int, default=256, help="Memory budget of the decoded images.")
+    parser.add_argument("--max-growth-mb", type=float, default=64,
+                        help="Largest allowed growth of the peak RSS from the fewest to the most scenes.")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    rows = []
+    peaks = {}
+    for scenes in args.scenes:
+        command = [sys.executable, os.path.abspath(__file__), "--child", str(scenes),
+                   "--resolution", *map(str, args.resolution), "--memory-budget-mb", str(args.memory_budget_mb)]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        peaks[scenes] = result["peak_rss_mb"]
+        rows.append((scenes, f"{result['wall']:.1f} s", f"{result['peak_rss_mb']:.0f} MB"))
+    print_table(("scenes", "wall-clock", "peak RSS"), rows)
+    growth = peaks[max(peaks)] - peaks[min(peaks)]
+    if growth > args.max_growth_mb:
+        sys.exit(f"FAIL: peak RSS grew by {growth:.0f} MB from {min(peaks)} to {max(peaks)} scenes "
+                 f"(limit {args.max_growth_mb:.0f} MB)")
+    print(f"OK: peak RSS grew by {growth:.0f} MB from {min(peaks)} to {max(peaks)} scenes")
+
+if __name__ == "__main__":
+    main()
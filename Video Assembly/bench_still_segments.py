@@ -0,0 +1,51 @@
+'''
+Benchmark : wall-clock time of `create_video` with the default MoviePy path versus the still segment fast path
+(`fast_stills=True`), rendered serially and in parallel, on the sample media of the repository. The duration of every
+output is read back, the benchmark fails (exit status 1) when a segmented video drifts from the MoviePy one by more than
+`--max-drift` seconds.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_still_segments.py" [--subtitles] [--workers N] [--max-drift 0.1]
+'''
+import argparse
+import os
+import sys
+import tempfile
+
+from moviepy import VideoFileClip
+
+from bench_common import (SAMPLE_AUDIO, SAMPLE_FONT, SAMPLE_IMAGES, SAMPLE_SCRIPT, load_assembler, print_table,
+                          timed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subtitles", action="store_true", help="Embed subtitles in the video.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Workers of the parallel run.")
+    parser.add_argument("--max-drift", type=float, default=0.1,
+                        help="Largest allowed difference with the duration of the MoviePy output, in seconds.")
+    args = parser.parse_args()
+
+    assembler = load_assembler()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = (("moviepy", False, 1),
+                ("still segments", True, 1),
+                (f"still segments x{args.workers}", True, args.workers))
+        for n, (name, fast_stills, workers) in enumerate(runs):
+            output_file = os.path.join(workdir, f"run_{n}.mp4")
+            elapsed = timed(assembler.create_video, SAMPLE_IMAGES, SAMPLE_AUDIO, SAMPLE_SCRIPT, SAMPLE_FONT,
+                            output_file, with_subtitles=args.subtitles, fast_stills=fast_stills, workers=workers)
+            with VideoFileClip(output_file) as clip:
+                duration = clip.duration
+            results.append((name, elapsed, os.path.getsize(output_file), duration))
+    baseline, baseline_duration = results[0][1], results[0][3]
+    print_table(("path", "wall-clock", "duration", "size", "speed-up"),
+                [(name, f"{elapsed:.2f} s", f"{duration:.2f} s", f"{size / 1e6:.2f} MB", f"x{baseline / elapsed:.2f}")
+                 for name, elapsed, size, duration in results])
+    drifted = [name for name, _, _, duration in results if abs(duration - baseline_duration) > args.max_drift]
+    if drifted:
+        sys.exit(f"FAIL: {', '.join(drifted)} drift from the moviepy duration by more than {args.max_drift} s")
+    print(f"OK: every duration within {args.max_drift} s of the moviepy one")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+'''
+Micro-benchmark : per-frame composite time as a function of the number of subtitles, for
+1. `CompositeVideoClip` with one `TextClip` layer per subtitle (the original `create_video` path),
+2. `IndexedCompositeVideoClip` with the same layers,
+3. `SubtitleOverlay` blitting pre-rendered bitmaps.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_timeline.py" [--counts 10 100 1000] [--frames 200]
+'''
+import argparse
+import random
+import time
+
+from moviepy import ColorClip, CompositeVideoClip, TextClip
+
+from bench_common import SAMPLE_FONT, print_table
+from subtitle_overlay import SubtitleOverlay
+from timeline import IndexedCompositeVideoClip
+
+SIZE = (1280, 720)
+CUE_DURATION = 2.0
+SUBTITLE = "The quick brown fox jumps over the lazy dog"
+
+
+def per_frame_time(clip, times):
+    """
+    Average time taken by `clip.get_frame` over `times`, in milliseconds.
+    """
+    start = time.perf_counter()
+    for t in times:
+        clip.get_frame(t)
+    return (time.perf_counter() - start) / len(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 50, 100, 500, 1000],
+                        help="Numbers of subtitles to benchmark.")
+    parser.add_argument("--frames", type=int, default=200, help="Frames rendered per measurement.")
+    args = parser.parse_args()
+
+    # A single rasterised subtitle is shared by every layer, so that building the timeline stays cheap.
+    text = TextClip(text=SUBTITLE,
+                    font=SAMPLE_FONT,
+                    color='white',
+                    bg_color='black',
+                    size=(1000, 100),
+                    method='caption',
+                    text_align="center",
+                    horizontal_align="center")
+    rows = []
+    for count in args.counts:
+        duration = count * CUE_DURATION
+        background = ColorClip(SIZE, color=(30, 30, 60), duration=duration)
+        layers = [text.with_start(n * CUE_DURATION).with_duration(CUE_DURATION).with_position('bottom')
+                  for n in range(count)]
+        cues = [(n * CUE_DURATION, (n + 1) * CUE_DURATION, SUBTITLE) for n in range(count)]
+        # Frames are rendered in order, as write_videofile does.
+        times = sorted(random.uniform(0, duration) for _ in range(args.frames))
+
+        composite = CompositeVideoClip([background, *layers])
+        indexed = IndexedCompositeVideoClip([background, *layers])
+        overlay = SubtitleOverlay(cues, SAMPLE_FONT).apply_to(background)
+        overlay.get_frame(0)
+        rows.append((count,
+                     f"{per_frame_time(composite, times):.2f} ms",
+                     f"{per_frame_time(indexed, times):.2f} ms",
+                     f"{per_frame_time(overlay, times):.2f} ms"))
+    print_table(("subtitles", "CompositeVideoClip", "IndexedCompositeVideoClip", "SubtitleOverlay"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+'''
+Benchmark : wall-clock time and file size of `create_video` with a constant frame rate versus a variable frame rate
+(`min_fps`, see `vfr.py`), with every backend of `create_video` (MoviePy, still segments, ffmpeg filter graph), on the
+sample media of the repository. The duration of every output is read back, a VFR video must last as long as its CFR
+counterpart.
+Usage (from the root of the repository):
+    python "Video Assembly/bench_vfr.py" [--subtitles] [--min-fps 1]
+'''
+import argparse
+import os
+import tempfile
+
+from moviepy import VideoFileClip
+
+from bench_common import (SAMPLE_AUDIO, SAMPLE_FONT, SAMPLE_IMAGES, SAMPLE_SCRIPT, load_assembler, print_table,
+                          timed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subtitles", action="store_true", help="Embed subtitles in the video.")
+    parser.add_argument("--min-fps", type=float, default=1.0, help="Frame rate of held stills in VFR mode.")
+    args = parser.parse_args()
+
+    assembler = load_assembler()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [(f"{backend}{' vfr' if min_fps else ''}", backend, min_fps)
+                for backend in assembler.BACKENDS for min_fps in (None, args.min_fps)]
+        for n, (name, backend, min_fps) in enumerate(runs):
+            output_file = os.path.join(workdir, f"run_{n}.mp4")
+            elapsed = timed(assembler.create_video, SAMPLE_IMAGES, SAMPLE_AUDIO, SAMPLE_SCRIPT, SAMPLE_FONT,
+                            output_file, with_subtitles=args.subtitles, min_fps=min_fps, backend=backend)
+            with VideoFileClip(output_file) as clip:
+                duration = clip.duration
+            results.append((name, elapsed, os.path.getsize(output_file), duration))
+    baseline_time, baseline_size = results[0][1], results[0][2]
+    print_table(("path", "wall-clock", "duration", "size", "speed-up", "size ratio"),
+                [(name, f"{elapsed:.2f} s", f"{duration:.2f} s", f"{size / 1e6:.2f} MB",
+                  f"x{baseline_time / elapsed:.2f}", f"{size / baseline_size:.2f}")
+                 for name, elapsed, size, duration in results])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+'''
+README : Encoding profiles of the video assembler.
+
+`write_videofile` used to be called with MoviePy's defaults whatever the extension of the output file and whatever the
+content. This module picks the codecs from the container (`CONTAINER_CODECS`) and the encoder settings from a profile:
+- `still` : tuned for slideshows of still images. A long GOP (one key frame every 10 seconds, the picture only changes
+  at scene cuts, fades and subtitle changes), `tune=stillimage` with x264 and a CRF close to visually lossless.
+- `default` : general purpose settings, close to ffmpeg's own defaults.
+- `draft` : the fastest settings, for previews, with a lower quality.
+Every renderer (MoviePy, still segments, orchestrator) takes its codec arguments from `encoder_settings`, so segments
+rendered by different engines stay identical and can be joined without re-encoding.
+With `min_fps`, the video is written with a variable frame rate: frames that are exact copies of the previous one are
+dropped before the encoder (`decimate_filter`) and the others keep their timestamps, so a held still costs `min_fps`
+frames per second instead of `fps`. See `vfr.py`.
+Run `bench_encoding.py` to compare the encode time and file size of every profile on the sample media.
+'''
+import math
+import os
+from dataclasses import dataclass
+
+PIXEL_FORMAT = "yuv420p"
+AUDIO_CHANNELS = 2
+
+# Container extension: (video codec, audio codec, audio sample rate). Opus only supports 48 kHz.
+CONTAINER_CODECS = {
+    ".mp4": ("libx264", "aac", 44100),
+    ".m4v": ("libx264", "aac", 44100),
+    ".mov": ("libx264", "aac", 44100),
+    ".mkv": ("libx264", "aac", 44100),
+    ".webm": ("libvpx-vp9", "libopus", 48000),
+    ".ogv": ("libtheora", "libvorbis", 44100),
+    ".avi": ("mpeg4", "libmp3lame", 44100),
+}
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    Encoder settings independent of the codec, translated for each codec by `video_params`.
+    Parameters:
+        name (str): Name of the profile.
+        crf (int): Constant rate factor on the x264 scale (0 = lossless, 23 = default, 51 = worst).
+        preset (str): x264 / x265 speed preset.
+        tune (str): x264 tuning, `None` for none.
+        gop_seconds (float): Maximum time between two key frames, `None` keeps the encoder default.
+        vp9_speed (int): `-cpu-used` of VP9, from 0 (slowest) to 8 (fastest).
+    """
+    name: str
+    crf: int
+    preset: str
+    tune: str = None
+    gop_seconds: float = None
+    vp9_speed: int = 2
+
+    def video_params(self, codec, fps, variable_frame_rate=False):
+        """
+        Encoder arguments of this profile for `codec`, without the `-c:v` option.
+        With a variable frame rate, `-g` counts the frames that are kept, key frames are also forced every
+        `gop_seconds` of video so that seeking stays fast in long held stills.
+        Returns:
+            list: ffmpeg arguments.
+        """
+        params = []
+        if codec in ("libx264", "libx265"):
+            params += ["-preset", self.preset, "-crf", str(self.crf)]
+            if self.tune and codec == "libx264":
+                params += ["-tune", self.tune]
+        elif codec == "libvpx-vp9":
+            # VP9's CRF scale goes up to 63, x264's 23 is roughly VP9's 33
+            params += ["-crf", str(min(self.crf + 10, 63)), "-b:v", "0",
+                       "-deadline", "realtime" if self.vp9_speed > 5 else "good", "-cpu-used", str(self.vp9_speed)]
+        elif codec == "libtheora":
+            params += ["-q:v", str(max(0, min(10, round((51 - self.crf) / 5))))]
+        else:
+            params += ["-q:v", str(max(2, min(31, round(self.crf / 5))))]
+        if self.gop_seconds:
+            params += ["-g", str(round(self.gop_seconds * fps))]
+            if variable_frame_rate:
+                params += ["-force_key_frames", f"expr:gte(t,n_forced*{self.gop_seconds})"]
+        return params + ["-pix_fmt", PIXEL_FORMAT]
+
+
+PROFILES = {
+    "still": EncodingProfile("still", crf=20, preset="medium", tune="stillimage", gop_seconds=10, vp9_speed=4),
+    "default": EncodingProfile("default", crf=23, preset="medium"),
+    "draft": EncodingProfile("draft", crf=30, preset="ultrafast", gop_seconds=10, vp9_speed=8),
+}
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """
+    Codecs and encoder arguments of one output file.
+    Parameters:
+        video_codec (str): ffmpeg video encoder.
+        audio_codec (str): ffmpeg audio encoder.
+        audio_fps (int): Audio sample rate.
+        video_params (tuple): Video encoder arguments, see `EncodingProfile.video_params`.
+        extension (str): Container extension, used for the intermediate files.
+        video_filter (str): Filter that renderers append to their filter chain, `None` for none. Set for a variable
+        frame rate, see `decimate_filter`.
+    """
+    video_codec: str
+    audio_codec: str
+    audio_fps: int
+    video_params: tuple
+    extension: str
+    video_filter: str = None
+
+    @property
+    def variable_frame_rate(self):
+        return self.video_filter is not None
+
+    def ffmpeg_args(self):
+        """Output arguments for an ffmpeg command line, `video_filter` is left to the caller's filter chain."""
+        frame_rate_mode = ["-fps_mode", "vfr"] if self.variable_frame_rate else []
+        return ["-c:v", self.video_codec, *self.video_params, *frame_rate_mode,
+                "-c:a", self.audio_codec, "-ar", str(self.audio_fps), "-ac", str(AUDIO_CHANNELS)]
+
+    def frame_rate_args(self, fps):
+        """
+        Output frame rate arguments for an ffmpeg command line. A variable frame rate output keeps the timestamps left
+        by `video_filter`, ffmpeg refuses `-r` together with `-fps_mode vfr`.
+        """
+        return [] if self.variable_frame_rate else ["-r", str(fps)]
+
+    def moviepy_args(self):
+        """Keyword arguments for MoviePy's `write_videofile`."""
+        ffmpeg_params = list(self.video_params)
+        if self.variable_frame_rate:
+            ffmpeg_params += ["-vf", self.video_filter, "-fps_mode", "vfr"]
+        return {"codec": self.video_codec, "audio_codec": self.audio_codec, "audio_fps": self.audio_fps,
+                "ffmpeg_params": ffmpeg_params}
+
+    def cache_tag(self):
+        """Text identifying these settings in the cache keys of encoded segments."""
+        return " ".join([self.extension, *self.ffmpeg_args(), self.video_filter or ""]).rstrip()
+
+
+def decimate_filter(fps, min_fps=1.0):
+    """
+    ffmpeg filter dropping the frames that are exact copies of the previous frame. Fade steps and subtitle changes
+    always differ from the previous frame and are kept, held stills are reduced to `min_fps` frames per second.
+    Parameters:
+        fps (int): Frame rate of the rendered frames.
+        min_fps (float): Lowest frame rate kept in held stills, 0 keeps a single frame per still.
+    Returns:
+        str: `mpdecimate` filter.
+    Raises:
+        ValueError: If `min_fps` is not lower than `fps`.
+    """
+    if not 0 <= min_fps < fps:
+        raise ValueError(f"min_fps must be at least 0 and lower than the frame rate ({fps}), got {min_fps}")
+    # `max` is the number of consecutive frames that can be dropped, 0 means no limit
+    max_dropped = math.ceil(fps / min_fps) - 1 if min_fps else 0
+    # Thresholds of 0: a frame is only dropped if none of its pixels changed
+    return f"mpdecimate=hi=0:lo=0:frac=0:max={max_dropped}"
+
+
+def encoder_settings(output_file, profile="still", fps=24, min_fps=None):
+    """
+    Selects the codecs from the extension of the output file and the encoder arguments from the profile.
+    Parameters:
+        output_file (str): Path of the video, only its extension is used.
+        profile (str or EncodingProfile): Name of a profile of `PROFILES`, or a custom profile.
+        fps (int): Frame rate of the video, used for the key frame interval.
+        min_fps (float): `None` for a constant frame rate. Otherwise the video has a variable frame rate and held
+        stills keep `min_fps` frames per second, see `decimate_filter`.
+    Returns:
+        EncoderSettings: Settings of the file.
+    Raises:
+        ValueError: If the extension or the profile is not known, or `min_fps` is out of range.
+    """
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in CONTAINER_CODECS:
+        raise ValueError(f"No codec known for '{extension}' files, use one of {', '.join(CONTAINER_CODECS)}")
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown encoding profile '{profile}', use one of {', '.join(PROFILES)}")
+        profile = PROFILES[profile]
+    video_filter = decimate_filter(fps, min_fps) if min_fps is not None else None
+    video_codec, audio_codec, audio_fps = CONTAINER_CODECS[extension]
+    video_params = profile.video_params(video_codec, fps, variable_frame_rate=video_filter is not None)
+    return EncoderSettings(video_codec, audio_codec, audio_fps, tuple(video_params), extension, video_filter)
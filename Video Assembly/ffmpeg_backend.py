@@ -0,0 +1,194 @@
+'''
+README : ffmpeg filter graph backend of the video assembler.
+
+The MoviePy backend computes every frame of the video in Python and pipes it to ffmpeg. This backend compiles the same
+timeline (the `SegmentSpec` list of `still_segments`) into a single ffmpeg filter graph and runs it in one ffmpeg
+process, so no frame ever goes through Python:
+- every image is an input decoded once and repeated by the `loop` filter for the duration of its segment,
+- fades to black are done by the `fade` filter, the same effect as the `FadeIn` / `FadeOut` of the MoviePy backend,
+- titles and subtitles are rasterised once per distinct text, with the same `TextClip` styling as the MoviePy
+  backend (`subtitle_overlay.rasterize_subtitle` for the subtitles), written to PNG files and drawn by the `overlay`
+  filter while they are shown, so the backend only needs the filters of a stock ffmpeg build (the imageio-ffmpeg
+  binary used by MoviePy has no `drawtext`),
+- the audio of every segment is padded or trimmed to the segment duration, silent segments use `anullsrc`,
+- the segments are joined by the `concat` filter, then go through the variable frame rate filter if any.
+The output matches the MoviePy backend within a tolerance, `bench_backends.py` measures both backends and the PSNR
+between their outputs.
+Every input is opened when the graph starts, so a very long script keeps one decoded image per scene in ffmpeg's
+memory, use the still segment engine (`fast_stills`) for those.
+'''
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+from moviepy import TextClip
+from PIL import Image
+
+from encoding_profiles import encoder_settings
+from still_segments import run_ffmpeg
+from subtitle_overlay import rasterize_subtitle
+
+TITLE_FONT_SIZE = 70
+
+
+def escape(value):
+    """
+    Escapes a filter option value, first for the option itself, then for the filter graph, see "Notes on filtergraph
+    escaping" in the ffmpeg filters documentation.
+    """
+    value = re.sub(r"([\\':])", r"\\\1", str(value))
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+
+def title_bitmap(text, font_path, font_size=TITLE_FONT_SIZE):
+    """
+    Renders a title like the `TextClip` of `create_intro_clip`.
+    Returns:
+        tuple: (RGB `uint8` array, alpha `uint8` array).
+    """
+    clip = TextClip(text=text, font_size=font_size, color="white", font=font_path)
+    rgb = clip.get_frame(0)[:, :, :3].astype(np.uint8)
+    alpha = np.rint(clip.mask.get_frame(0) * 255).astype(np.uint8) if clip.mask is not None else \
+        np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    clip.close()
+    return rgb, alpha
+
+
+def subtitle_bitmap(text, font_path):
+    """
+    Renders a subtitle chunk like `SubtitleOverlay`, from the bitmap cached by `rasterize_subtitle`.
+    Returns:
+        tuple: (RGB `uint8` array, alpha `uint8` array).
+    """
+    premultiplied, inverse_alpha, _ = rasterize_subtitle(text, font_path)
+    alpha = 255 - inverse_alpha
+    rgb = premultiplied // np.maximum(alpha, 1)
+    return rgb.astype(np.uint8), alpha[:, :, 0].astype(np.uint8)
+
+
+class FilterGraph:
+    """
+    Builds the command line of a single ffmpeg run rendering a list of segments.
+    Parameters:
+        size (tuple): (width, height) of the video.
+        font_path (str): Path to the font used for titles and subtitles.
+        fps (int): Frame rate of the video.
+        settings (EncoderSettings): Codecs and encoder arguments of the output file.
+        workdir (str): Folder for the text bitmaps drawn by `overlay`.
+    """
+
+    def __init__(self, size, font_path, fps, settings, workdir):
+        self.size = size
+        self.font_path = font_path
+        self.fps = fps
+        self.settings = settings
+        self.workdir = workdir
+        self.inputs = []
+        self.chains = []
+        # PNG file of every distinct title and subtitle, keyed on (kind, text)
+        self.bitmaps = {}
+
+    def _input(self, path):
+        self.inputs += ["-i", path]
+        return len(self.inputs) // 2 - 1
+
+    def _bitmap(self, kind, text):
+        # Each distinct text is rasterised once, every use is a new input of the same file
+        key = (kind, text)
+        if key not in self.bitmaps:
+            rgb, alpha = (title_bitmap if kind == "title" else subtitle_bitmap)(text, self.font_path)
+            path = os.path.join(self.workdir, f"{kind}_{len(self.bitmaps):05d}.png")
+            Image.fromarray(np.dstack([rgb, alpha]), "RGBA").save(path, compress_level=1)
+            self.bitmaps[key] = path
+        return self._input(self.bitmaps[key])
+
+    def _overlays(self, spec):
+        # (input, position, enable expression) of every bitmap drawn on the segment
+        overlays = []
+        if spec.title is not None:
+            overlays.append((self._bitmap("title", spec.title), "x=(W-w)/2:y=(H-h)/2", None))
+        for start, end, text in spec.subtitles:
+            # Same placement as `SubtitleOverlay`, bottom center
+            overlays.append((self._bitmap("subtitle", text), "x=(W-w)/2:y=H-h",
+                             f"gte(t,{start:.6f})*lt(t,{end:.6f})"))
+        return overlays
+
+    def add_segment(self, n, spec):
+        """Adds the video and audio chains of segment `n`, labelled `[v<n>]` and `[a<n>]`."""
+        width, height = self.size
+        image = self._input(spec.image)
+        video = [
+            # The image is decoded once and repeated, on an exact 1/fps time base
+            "loop=loop=-1:size=1:start=0", f"settb=1/{self.fps}", "setpts=N", f"trim=duration={spec.duration:.6f}",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black", "setsar=1",
+        ]
+        if spec.fade:
+            video.append(f"fade=t=in:st=0:d={spec.fade}")
+            video.append(f"fade=t=out:st={max(spec.duration - spec.fade, 0):.6f}:d={spec.fade}")
+        overlays = self._overlays(spec)
+        label = f"v{n}" if not overlays else f"v{n}_0"
+        self.chains.append(f"[{image}:v]{','.join(video)}[{label}]")
+        for k, (bitmap, position, enable) in enumerate(overlays):
+            # The bitmap is a single frame, `overlay` repeats it until the end of the segment. Blending in RGB keeps
+            # odd positions, in YUV 4:2:0 they would be rounded to even ones and the text moved by a pixel
+            options = f"overlay={position}:eof_action=repeat:format=rgb"
+            if enable:
+                options += f":enable={escape(enable)}"
+            output = f"v{n}" if k == len(overlays) - 1 else f"v{n}_{k + 1}"
+            self.chains.append(f"[{label}][{bitmap}:v]{options}[{output}]")
+            label = output
+
+        rate = self.settings.audio_fps
+        if spec.audio:
+            audio = self._input(spec.audio)
+            source = f"[{audio}:a]aresample={rate},aformat=sample_rates={rate}:channel_layouts=stereo,"
+        else:
+            source = f"anullsrc=r={rate}:cl=stereo,"
+        self.chains.append(f"{source}apad=whole_dur={spec.duration:.6f},atrim=duration={spec.duration:.6f}[a{n}]")
+
+    def command(self, output_file, count):
+        """
+        Arguments of the ffmpeg run. The graph itself is written to a script file, a long video doesn't fit on a
+        command line.
+        """
+        labels = "".join(f"[v{n}][a{n}]" for n in range(count))
+        chains = self.chains + [f"{labels}concat=n={count}:v=1:a=1[video][audio]"]
+        video = "[video]"
+        if self.settings.video_filter:
+            chains.append(f"[video]{self.settings.video_filter}[output]")
+            video = "[output]"
+        script_path = os.path.join(self.workdir, "graph.txt")
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.write(";\n".join(chains))
+        args = [*self.inputs, "-filter_complex_script", script_path, "-map", video, "-map", "[audio]",
+                *self.settings.frame_rate_args(self.fps), *self.settings.ffmpeg_args()]
+        if self.settings.extension in (".mp4", ".m4v", ".mov"):
+            args += ["-movflags", "+faststart"]
+        return args + [output_file]
+
+
+def render_filter_graph(specs, output_file, font_path, size, fps=24, profile="still", min_fps=None):
+    """
+    Renders a video in a single ffmpeg run, from the same segments as the still segment engine.
+    Parameters:
+        specs (list): `SegmentSpec` of every segment, in playback order.
+        output_file (str): Path of the final video.
+        font_path (str): Path to the font used for titles and subtitles.
+        size (tuple): (width, height) of the video, the images are expected to be normalised to it (`image_prep`).
+        fps (int): Frame rate of the video.
+        profile (str or EncodingProfile): Encoding profile, the codecs are picked from the extension of `output_file`.
+        min_fps (float): `None` for a constant frame rate, otherwise the frame rate of held stills, see `vfr.py`.
+    Raises:
+        RuntimeError: If ffmpeg fails.
+    """
+    settings = encoder_settings(output_file, profile, fps, min_fps)
+    workdir = tempfile.mkdtemp(prefix="forgetube_graph_")
+    try:
+        graph = FilterGraph(size, font_path, fps, settings, workdir)
+        for n, spec in enumerate(specs):
+            graph.add_segment(n, spec)
+        run_ffmpeg(graph.command(output_file, len(specs)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,167 @@
+'''
+README : Image pre-normalisation stage of the video assembler.
+
+The images of a video rarely share a size (`Samples/Images/Cats Old` mixes very different ones). `create_video` used to
+leave that to the `compose` method of the concatenation, which composites every frame onto a canvas sized to the largest
+image, and to ffmpeg's `pad` filter in the still segment engine.
+`ImagePrep` normalises every image once, before anything is rendered:
+1. The image is decoded once. Large JPEGs are decoded in draft mode, the decoder itself scales them down by 1/2, 1/4 or
+   1/8 when the target is that much smaller, which skips most of the decoding work.
+2. It is resized to fit the target resolution with a bilinear filter (after an integer box reduction for big downscales)
+   and letterboxed, centered on a black canvas of exactly the target resolution.
+3. The normalised frame is kept in a cache folder as a PNG file, keyed on the content of the image and the resolution,
+   so re-rendering a script doesn't decode or resize anything again. Like the segment cache, the folder is kept under
+   a size limit, the least recently used frames are removed first.
+The compositor then only handles RGB `uint8` arrays of the video size, and the still segment engine only looped PNGs
+that need no padding.
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from segment_cache import evict_lru, file_digest
+
+RESAMPLE = Image.Resampling.BILINEAR
+# Downscales by more than this factor first reduce the image by an integer factor with a box filter, see `Image.resize`
+REDUCING_GAP = 2.0
+BACKGROUND = (0, 0, 0)
+
+
+def fit_size(image_size, size):
+    """
+    Computes the largest size with the aspect ratio of the image that fits in the target size.
+    Parameters:
+        image_size (tuple): (width, height) of the image.
+        size (tuple): (width, height) of the video.
+    Returns:
+        tuple: (width, height) of the resized image.
+    """
+    scale = min(size[0] / image_size[0], size[1] / image_size[1])
+    return (max(1, min(size[0], round(image_size[0] * scale))),
+            max(1, min(size[1], round(image_size[1] * scale))))
+
+
+def normalise_image(path, size):
+    """
+    Decodes an image, resizes it to fit `size` and letterboxes it on a black canvas of exactly `size`.
+    Parameters:
+        path (str): Path of the image.
+        size (tuple): (width, height) of the video.
+    Returns:
+        Image: RGB image of the video size.
+    """
+    with Image.open(path) as img:
+        fitted = fit_size(img.size, size)
+        if img.format == "JPEG" and fitted[0] < img.width:
+            # The decoder picks the smallest DCT scale that is still at least `fitted`
+            img.draft("RGB", fitted)
+        img = img.convert("RGB")
+    if img.size != fitted:
+        img = img.resize(fitted, RESAMPLE, reducing_gap=REDUCING_GAP)
+    if fitted == tuple(size):
+        return img
+    canvas = Image.new("RGB", size, BACKGROUND)
+    canvas.paste(img, ((size[0] - fitted[0]) // 2, (size[1] - fitted[1]) // 2))
+    return canvas
+
+
+class ImagePrep:
+    """
+    Normalised frames of the images of a video, cached on disk.
+    Parameters:
+        size (tuple): (width, height) of the video, rounded up to even numbers as required by yuv420p.
+        root (str): Folder of the normalised frames, created if missing. `None` uses a temporary folder, removed by
+        `close`.
+        max_bytes (int): Size limit of a cache folder, enforced by `close`. The frames used by this instance are never
+        removed.
+    """
+
+    def __init__(self, size, root=None, max_bytes=1024**3):
+        self.size = (size[0] + size[0] % 2, size[1] + size[1] % 2)
+        self.max_bytes = max_bytes
+        self.temporary = root is None
+        # Keys of the frames used by this instance
+        self.used = set()
+        self.root = tempfile.mkdtemp(prefix="forgetube_frames_") if root is None else root
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, path):
+        """Cache key of the normalised frame of an image."""
+        return hashlib.sha256(f"{file_digest(path)}\0{self.size[0]}x{self.size[1]}".encode()).hexdigest()
+
+    def path(self, image_path):
+        """
+        Normalises an image, unless its frame is already in the cache.
+        Parameters:
+            image_path (str): Path of the original image.
+        Returns:
+            str: Path of the normalised frame.
+        """
+        path = self._cached_path(image_path)
+        if not self._touch(path):
+            self._store(normalise_image(image_path, self.size), path)
+        return path
+
+    def _cached_path(self, image_path):
+        key = self.key(image_path)
+        self.used.add(key)
+        return os.path.join(self.root, f"{key}.png")
+
+    @staticmethod
+    def _touch(path):
+        # Marks a cached frame as recently used, False on a miss
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def _store(img, path):
+        partial = f"{path}.{os.getpid()}.part"
+        # Fast zlib level, the frames are read back once per render
+        img.save(partial, format="PNG", compress_level=1)
+        os.replace(partial, path)
+
+    def paths(self, image_paths, workers=None):
+        """
+        Normalises a list of images, in threads (decoding and resizing release the GIL). An image listed several
+        times is only normalised once.
+        Returns:
+            list: Paths of the normalised frames, in the same order.
+        """
+        unique = list(dict.fromkeys(image_paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            prepared = dict(zip(unique, pool.map(self.path, unique)))
+        return [prepared[path] for path in image_paths]
+
+    def frame(self, image_path):
+        """
+        Loads the normalised frame of an image, normalising it first on a cache miss.
+        Returns:
+            numpy.ndarray: Contiguous `uint8` array of shape (height, width, 3).
+        """
+        path = self._cached_path(image_path)
+        if self._touch(path):
+            with Image.open(path) as img:
+                img = img.convert("RGB")
+        else:
+            img = normalise_image(image_path, self.size)
+            if not self.temporary:
+                self._store(img, path)
+        return np.ascontiguousarray(np.asarray(img, dtype=np.uint8))
+
+    def close(self):
+        """
+        Removes the folder of the frames if it is temporary, otherwise removes the least recently used frames until
+        the folder fits in `max_bytes`.
+        """
+        if self.temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+        else:
+            evict_lru(self.root, self.max_bytes, keep=self.used)
@@ -1,57 +1,27 @@
-import json
 # from datetime import datetime, timedelta
 
+import _paths  # noqa: F401, adds diffusion/scripts to the import path
+from script_model import iter_audio, read_header
+
 '''
 extract_topic_from_json extract() takes json file path as input.
-- Opens the file as read-only and loads the JSON data from it.
-- Extracts the topic from the JSON data.
+- Reads only the header of the script with read_header().
+- Raises FileNotFoundError or ScriptError if the file is missing or invalid.
 
 On success, it returns the topic of the video.
 '''
 def extract_topic_from_json(file_path):
-    try:
-        # Open the JSON file
-        with open(file_path, 'r') as file:
-            # Load JSON data from the file
-            data = json.load(file)
-            
-            # Extract the topic, and audio_script from the JSON data
-            topic = data.get('topic', 'No topic found')
-            
-            return topic
-    except FileNotFoundError:
-        print(f"Error: The file {file_path} was not found.")
-    except json.JSONDecodeError:
-        print(f"Error: The file {file_path} contains invalid JSON.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    return read_header(file_path)["topic"]
 
 '''
 extract_audio_topic_from_json() takes json file path as input.
-- Opens the file as read-only and loads the JSON data from it.
-- Extracts the audio_script from the JSON data.
+- Streams the segments with iter_audio(), .json or .jsonl scripts.
+- Raises FileNotFoundError or ScriptError while iterating if the file is missing or invalid.
 
-On success, it returns audio_script.
+On success, it returns an iterator over the audio_script as AudioSegment objects.
 '''
 def extract_audio_from_json(file_path):
-    try:
-        # Open the JSON file
-        with open(file_path, 'r') as file:
-            # Load JSON data from the file
-            data = json.load(file)
-            
-            # Extract the topic, audio_script and visual_script
-            topic = data.get('topic', 'No topic found')
-            audio_script = data.get('audio_script', [])
-            # visual_script = data.get('visual_script', [])
-
-            return audio_script
-    except FileNotFoundError:
-        print(f"Error: The file {file_path} was not found.")
-    except json.JSONDecodeError:
-        print(f"Error: The file {file_path} contains invalid JSON.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    return iter_audio(file_path)
 
 # # Calculating the end timestamp of the subtitle
 # def calculate_endtimestamp(start_time, duration):
@@ -76,19 +46,11 @@ On success, it returns the subtitles in list format, and the topic.
 def json_extract(json_path):
     
     # Extract parameters from json file
-    audio_script = extract_audio_from_json(json_path)
-    if audio_script:
-        # print("Extracted Audio Parameters:")
-        audio_data = []
-        for item in audio_script:
-            if 'text' in item:
-                text = item['text']
-                audio_data.append(text)
-        return audio_data
+    subtitles = [segment.text for segment in extract_audio_from_json(json_path)]
+    if subtitles:
+        return subtitles
     else:
         return "No audio script found in the JSON file."
 
 json_path = "samples/templates/mock_script.json"
-topic = extract_topic_from_json(json_path)
-audio_data = json_extract(json_path)
-print(topic, audio_data)
\ No newline at end of file
+print(extract_topic_from_json(json_path), json_extract(json_path))
\ No newline at end of file
@@ -0,0 +1,149 @@
+'''
+README : Lazy scene clips with bounded memory.
+
+`create_video` used to open an `AudioFileClip` and decode an `ImageClip` for every scene before rendering started, and
+never closed them: a 200 scene video kept 200 decoded images in memory and 200 ffmpeg reader processes alive.
+The clips made by a `MediaPool` only hold a path until they are rendered:
+- the image of a scene is decoded the first time one of its frames is requested, the audio reader of a scene is opened
+  the first time one of its samples is requested,
+- frames and samples are requested in order by `write_videofile`, so when a scene starts playing, every scene that
+  ended before it is released right away: the image array is dropped and the ffmpeg reader is closed,
+- on top of that, the decoded images are kept under `memory_budget` bytes and at most `max_readers` audio readers are
+  open, the least recently used ones are released first (e.g. when a preview seeks back and forth).
+Memory use then depends on the resolution of the video, not on the number of scenes. Run `bench_memory.py` to check
+that peak memory stays flat as the scene count grows.
+'''
+from collections import OrderedDict
+
+from moviepy import AudioClip, AudioFileClip, VideoClip
+
+AUDIO_FPS = 44100
+AUDIO_CHANNELS = 2
+
+
+class _LazyImage:
+    def __init__(self, pool, load, start, end):
+        self.pool = pool
+        self.load = load
+        self.start = start
+        self.end = end
+        self.array = None
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes if self.array is not None else 0
+
+    def frame(self, t):
+        if self.array is None:
+            self.array = self.load()
+        self.pool.touch(self)
+        return self.array
+
+    def release(self):
+        self.array = None
+
+
+class _LazyAudio:
+    def __init__(self, pool, path, start, end):
+        self.pool = pool
+        self.path = path
+        self.start = start
+        self.end = end
+        self.reader = None
+
+    def frame(self, t):
+        if self.reader is None:
+            self.reader = AudioFileClip(self.path, fps=AUDIO_FPS)
+        self.pool.touch(self)
+        return self.reader.get_frame(t)
+
+    def release(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+class MediaPool:
+    """
+    Creates lazy scene clips and releases their media once they are no longer needed.
+    Parameters:
+        memory_budget (int): Maximum number of bytes of decoded images kept at the same time. The image being rendered
+        is always kept, even if it is larger.
+        max_readers (int): Maximum number of audio readers (ffmpeg processes) open at the same time.
+    """
+
+    def __init__(self, memory_budget=256 * 1024**2, max_readers=4):
+        self.memory_budget = memory_budget
+        self.max_readers = max_readers
+        self.resources = []
+        # Loaded resources, least recently used first
+        self.images = OrderedDict()
+        self.readers = OrderedDict()
+        self.peak_bytes = 0
+        self.peak_readers = 0
+
+    def image_clip(self, load, size, start, duration):
+        """
+        Creates a video clip showing a still image, decoded on demand.
+        Parameters:
+            load (callable): Returns the image as a `uint8` array of shape (height, width, 3).
+            size (tuple): (width, height) of the image, the image isn't decoded to find it out.
+            start (float): Start of the clip in the final video, in seconds.
+            duration (float): Duration of the clip in seconds.
+        Returns:
+            VideoClip: The clip.
+        """
+        resource = self._register(_LazyImage(self, load, start, start + duration))
+        # Created without a frame function, VideoClip would otherwise decode the first frame to find the size
+        clip = VideoClip(duration=duration)
+        clip.frame_function = resource.frame
+        clip.size = tuple(size)
+        return clip
+
+    def audio_clip(self, path, start, duration):
+        """
+        Creates an audio clip reading an audio file, opened on demand.
+        Parameters:
+            path (str): Path of the audio file.
+            start (float): Start of the clip in the final video, in seconds.
+            duration (float): Duration of the clip in seconds.
+        Returns:
+            AudioClip: The clip.
+        """
+        resource = self._register(_LazyAudio(self, path, start, start + duration))
+        # Same as for the images, AudioClip would open the reader to find the number of channels
+        clip = AudioClip(duration=duration, fps=AUDIO_FPS)
+        clip.frame_function = resource.frame
+        clip.nchannels = AUDIO_CHANNELS
+        return clip
+
+    def _register(self, resource):
+        self.resources.append(resource)
+        return resource
+
+    def touch(self, resource):
+        # Called on every frame, the release only runs when the resource wasn't the most recently used one
+        loaded = self.images if isinstance(resource, _LazyImage) else self.readers
+        if loaded and next(reversed(loaded)) is resource:
+            return
+        loaded[resource] = None
+        loaded.move_to_end(resource)
+        # Everything that ended before this scene started won't be played again
+        for other in [other for other in (*self.images, *self.readers) if other.end <= resource.start]:
+            self._release(other)
+        while len(self.images) > 1 and sum(image.nbytes for image in self.images) > self.memory_budget:
+            self._release(next(iter(self.images)))
+        while len(self.readers) > self.max_readers:
+            self._release(next(iter(self.readers)))
+        self.peak_bytes = max(self.peak_bytes, sum(image.nbytes for image in self.images))
+        self.peak_readers = max(self.peak_readers, len(self.readers))
+
+    def _release(self, resource):
+        resource.release()
+        self.images.pop(resource, None)
+        self.readers.pop(resource, None)
+
+    def close(self):
+        """Releases every image and closes every audio reader."""
+        for resource in self.resources:
+            self._release(resource)
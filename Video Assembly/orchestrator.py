@@ -0,0 +1,355 @@
+'''
+README : End to end orchestrator, from the script to the final video in one run.
+
+The stages used to run one after the other, each to completion: `generate_audio.py` wrote `output_audio/`,
+`generate_image.py` wrote `imagedir/`, and only then did the assembler start encoding. `run_pipeline` overlaps them:
+- the TTS stage and the image stage run at the same time, each in its own thread, reading the script lazily,
+- every finished audio segment and image is announced on a bounded queue,
+- a scene is handed to the segment encoders (`still_segments`) as soon as both its audio and its image exist, its image
+  normalised to the video size by `image_prep.ImagePrep` like in `create_video`,
+- once every scene is encoded, the segments are joined without re-encoding.
+With `incremental=True`, the script is compared with the version built by the previous run (`script_diff`): the audio
+and images of the unchanged scenes are taken from the previous run, only the changed scenes are sent to the TTS and
+image stages, and with a segment cache only the changed scenes are encoded again.
+The queue and the number of segments being encoded are bounded, so a slow encoder pushes back on the generators instead
+of piling up audio in memory, and the total time approaches the time of the slowest stage rather than the sum of all.
+'''
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import replace
+
+from PIL import Image
+
+from audio_manifest import AudioManifest, ManifestSegment
+from encoding_profiles import encoder_settings
+from image_prep import ImagePrep
+from segment_cache import SegmentCache
+from still_segments import SegmentSpec, concat_segments, render_segment
+from subtitle_timeline import SubtitleTimeline
+
+import _paths  # noqa: F401, adds diffusion/scripts to the import path
+from script_diff import diff_scripts
+from profiling import add_span, reset, save_profile, span
+from script_model import iter_audio, iter_visual, load_script, read_header
+
+BACKGROUND_IMAGE = "Samples/Intro/intro.jpg"
+OUTRO_TEXT = "Thank you for watching! Made by ForgeTube team."
+INTRO_DURATION = 5
+
+
+def _canvas_size(background_image_path, visual_segments):
+    # Size of the video, known before any image exists: the largest of the background and of the requested image sizes,
+    # rounded up to even numbers as required by yuv420p.
+    with Image.open(background_image_path) as img:
+        width, height = img.size
+    for segment in visual_segments:
+        width = max(width, segment.width)
+        height = max(height, segment.height)
+    return width + width % 2, height + height % 2
+
+
+def _set_aside(folder):
+    # Moves the artifacts of the previous run out of the way, so they can be read while the new ones are written
+    previous = os.path.normpath(folder) + ".previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if not os.path.isdir(folder):
+        return None
+    os.replace(folder, previous)
+    return previous
+
+
+def _restore(folder, previous):
+    # Puts the artifacts of the previous run back after a failed run, they stay the baseline of the next one
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(previous, folder)
+
+
+def _link_or_copy(source, destination):
+    # The previous run's file stays in place, so its folder can be restored if this run fails
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _scene_cues(text, sample_rate, num_samples, words):
+    # Subtitle cues of one scene, relative to its start, from the word timings of the TTS stage when there are some
+    manifest = AudioManifest(sample_rate, [ManifestSegment(0, None, 0, num_samples,
+                                                           [(word["text"], word["start"], word["end"])
+                                                            for word in words])])
+    return SubtitleTimeline([text], manifest=manifest, offset=0).scene_cues(0)
+
+
+class StageCancelled(Exception):
+    """Raised inside a stage once the orchestrator has stopped, so that it stops generating."""
+
+
+class _Stage(threading.Thread):
+    """
+    Runs one generation stage in a thread and forwards its results to the orchestrator through a bounded queue.
+    Parameters:
+        name (str): Name of the stage, used in the events.
+        events (Queue): Queue shared by all the stages.
+        work (callable): Function of the stage, called with the `emit` function of the stage.
+        stopped (Event): Set by the orchestrator when it stops listening, after an error or at the end of the run.
+    """
+
+    def __init__(self, name, events, work, stopped):
+        super().__init__(name=name, daemon=True)
+        self.events = events
+        self.work = work
+        self.stopped = stopped
+
+    def emit(self, *event):
+        # Blocks while the queue is full, cancels the stage once the orchestrator has stopped listening
+        while not self.stopped.is_set():
+            try:
+                self.events.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise StageCancelled(self.name)
+
+    def run(self):
+        try:
+            try:
+                with span(f"stage.{self.name}"):
+                    self.work(self.emit)
+                self.emit("done", self.name, None)
+            except StageCancelled:
+                raise
+            except Exception as e:
+                self.emit("error", self.name, e)
+        except StageCancelled:
+            pass
+
+
+def run_pipeline(script_path, output_file, font_path, with_subtitles=False, audio_dir="output_audio",
+                 master_output_path="master_output.wav", tts_workers=1, encode_workers=2, queue_size=8,
+                 cache_dir=None, srt_output=None, background_image_path=BACKGROUND_IMAGE, outro_text=OUTRO_TEXT,
+                 fps=24, incremental=False, profile_path=None, profile="still", min_fps=None):
+    """
+    Generates the narration and the images of a script and assembles the video, with the stages overlapping.
+    Scene `n` is made of the `n`-th segment of the `audio_script` and the `n`-th segment of the `visual_script`.
+    Parameters:
+        script_path (str): Path of the script, `.json` or `.jsonl`.
+        output_file (str): Path of the final video.
+        font_path (str): Path to the font used for titles and subtitles.
+        with_subtitles (bool): When set to true embeds the subtitles in the video.
+        audio_dir (str): Folder of the audio segments and of the timing manifest.
+        master_output_path (str): Path of the merged narration.
+        tts_workers (int): Number of TTS worker processes.
+        encode_workers (int): Number of segments encoded at the same time, each in its own process.
+        queue_size (int): Maximum number of finished audio segments and images waiting to be encoded.
+        cache_dir (str): Folder of the segment cache, `None` disables caching. The normalised images are cached in
+        `cache_dir/frames`.
+        srt_output (str): When given, the `.srt` file of the whole video is written to this path.
+        background_image_path (str): Background image of the intro and outro clips.
+        outro_text (str): Text shown in the outro clip.
+        fps (int): Frame rate of the video.
+        incremental (bool): When set to true, only the scenes that changed since the previous run are generated again,
+        the others reuse its audio segments and images. Combine with `cache_dir` to also skip their encoding. The
+        script of the last successful run is kept next to `output_file`, as `<name>.built.json` (or `.jsonl`).
+        profile_path (str): When given, the spans of every stage are saved to this JSON file, with a Chrome trace next
+        to it (see `diffusion/scripts/profiling.py`).
+        profile (str or EncodingProfile): Encoding profile, the codecs are picked from the extension of `output_file`.
+        min_fps (float): `None` for a constant frame rate, otherwise held stills are written at `min_fps` frames per
+        second with a variable frame rate (see `vfr.py`).
+    Raises:
+        RuntimeError: If a stage fails, or if some scenes have no audio or no image once every stage is done.
+    """
+    # The profile only covers this run, not the earlier ones of the same process
+    reset()
+    # Only the sizes are read here, which also validates the whole visual script before any GPU time is spent
+    size = _canvas_size(background_image_path, iter_visual(script_path))
+    settings = encoder_settings(output_file, profile, fps, min_fps)
+    topic = read_header(script_path)["topic"]
+    events = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    texts = {}
+    # Copy of the script this run builds, the next incremental run is compared with it. Kept out of the artifact folders,
+    # which are set aside while the run is going on
+    snapshot_path = os.path.splitext(output_file)[0] + ".built" + os.path.splitext(script_path)[1]
+    previous_script = load_script(snapshot_path) if incremental and os.path.exists(snapshot_path) else None
+    diff = diff_scripts(previous_script, load_script(script_path)) if previous_script else None
+    if diff:
+        print(diff.report())
+    previous_dirs = []
+
+    def tts(emit):
+        from generate_audio import generate_audio, load_segment, merge_audio
+
+        previous = _set_aside(audio_dir) if diff else None
+        previous_manifest = os.path.join(previous, "manifest.json") if previous else None
+        old_segments = AudioManifest.load(previous_manifest).segments if previous_manifest and os.path.exists(
+            previous_manifest) else []
+        previous_dirs.append((audio_dir, previous))
+
+        def reused(n):
+            # Segment of the previous run with the same narration, None if the scene has to be synthesized
+            old = diff.audio_reuse.get(n) if diff else None
+            if old is None or old >= len(old_segments) or not old_segments[old].file:
+                return None
+            return old_segments[old] if os.path.exists(old_segments[old].file) else None
+
+        def pending():
+            # Segments sent to the TTS workers, read ahead of `segments` by the worker queue
+            for segment in iter_audio(script_path):
+                if stopped.is_set():
+                    raise StageCancelled("tts")
+                if not reused(segment.index):
+                    yield segment
+
+        synthesized = generate_audio(pending(), max_workers=tts_workers)
+
+        def segments():
+            for segment in iter_audio(script_path):
+                if stopped.is_set():
+                    raise StageCancelled("tts")
+                texts[segment.index] = segment.text
+                old = reused(segment.index)
+                if old:
+                    yield load_segment(old.file, [{"text": text, "start": start, "end": end}
+                                                  for text, start, end in old.words])
+                else:
+                    yield next(synthesized)
+
+        merge_audio(segments(), output_dir=audio_dir, master_output_path=master_output_path,
+                    on_segment=lambda idx, path, segment: emit("audio", idx, (path, segment.timing())))
+
+    def images(emit):
+        import generate_image
+
+        previous = _set_aside(generate_image.output_path) if diff else None
+        os.makedirs(generate_image.output_path, exist_ok=True)
+        previous_dirs.append((generate_image.output_path, previous))
+
+        def pending():
+            # Images of unchanged scenes are linked from the previous run, the others are generated
+            for segment in iter_visual(script_path):
+                if stopped.is_set():
+                    raise StageCancelled("images")
+                old = diff.visual_reuse.get(segment.index) if diff and previous else None
+                old_path = os.path.join(previous, f"scene_{previous_script.visual[old].scene_id}.png") \
+                    if old is not None else None
+                if old_path and os.path.exists(old_path):
+                    path = os.path.join(generate_image.output_path, f"scene_{segment.scene_id}.png")
+                    _link_or_copy(old_path, path)
+                    emit("image", segment.index, path)
+                else:
+                    yield segment
+
+        _, _, failed = generate_image.generate_images(pending(), on_saved=lambda idx, path: emit("image", idx, path))
+        if failed:
+            raise RuntimeError(f"Image generation failed for scenes {failed}")
+
+    stages = [_Stage("tts", events, tts, stopped), _Stage("images", events, images, stopped)]
+    cache = SegmentCache(cache_dir) if cache_dir else None
+    # Every image is resized and letterboxed to the video size once, the same frames as `create_video` renders
+    frames = ImagePrep(size, os.path.join(cache_dir, "frames") if cache_dir else None)
+    workdir = tempfile.mkdtemp(prefix="forgetube_pipeline_")
+    threads = max(1, (os.cpu_count() or 1) // encode_workers)
+    audio, image, segment_paths = {}, {}, {}
+    running = {}
+    keys = []
+    encoded = []
+
+    def submit(n, spec, label):
+        # Segments are ordered by n, the intro is -1 and the outro comes after the last scene
+        with span("assembly.image_prep", label=label):
+            spec = replace(spec, image=frames.path(spec.image))
+        key = cache.key(spec, size, font_path, fps, settings) if cache else None
+        keys.append(key)
+        cached_path = cache.get(key, settings.extension) if cache else None
+        if cached_path:
+            segment_paths[n] = cached_path
+            print(f"{label} reused from cache")
+            return
+        path = os.path.join(workdir, f"segment_{n + 1:05d}{settings.extension}")
+        future = pool.submit(render_segment, spec, path, size, font_path, fps, threads, settings)
+        running[future] = (n, key, path, label, time.perf_counter())
+
+    def collect(futures):
+        for future in futures:
+            n, key, path, label, submitted = running.pop(future)
+            future.result()
+            # Time from submission to completion, the encoding itself runs in a worker process
+            add_span("encode.segment", time.perf_counter() - submitted, label=label)
+            segment_paths[n] = cache.put(key, path) if cache else path
+            encoded.append(label)
+            print(f"{label} encoded")
+
+    succeeded = False
+    try:
+        # Spawned, not forked: the TTS and image threads may hold torch, import or logging locks when the first
+        # segment is submitted, a forked worker would inherit them locked
+        with ProcessPoolExecutor(max_workers=encode_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for stage in stages:
+                stage.start()
+            submit(-1, SegmentSpec(image=background_image_path, duration=INTRO_DURATION, title=topic, fade=0), "Intro")
+            active = {stage.name for stage in stages}
+            while active:
+                # At most encode_workers segments are queued in the pool, the stages wait on the event queue meanwhile
+                while len(running) >= encode_workers:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+                kind, name_or_idx, value = events.get()
+                if kind == "error":
+                    raise RuntimeError(f"The {name_or_idx} stage failed: {value}") from value
+                if kind == "done":
+                    active.discard(name_or_idx)
+                    continue
+                n = name_or_idx
+                (audio if kind == "audio" else image)[n] = value
+                if n in audio and n in image:
+                    path, timing = audio[n]
+                    duration = timing.num_samples / timing.sample_rate
+                    cues = _scene_cues(texts[n], timing.sample_rate, timing.num_samples,
+                                       timing.words) if with_subtitles else []
+                    submit(n, SegmentSpec(image=image[n], duration=duration, audio=path, subtitles=cues),
+                           f"Scene {n + 1}")
+            missing = sorted(set(audio) ^ set(image))
+            if missing:
+                raise RuntimeError(f"Scenes {[n + 1 for n in missing]} have an audio segment or an image, not both")
+            outro = max(audio, default=-1) + 1
+            submit(outro, SegmentSpec(image=background_image_path, duration=INTRO_DURATION, title=outro_text, fade=0),
+                   "Outro")
+            collect(list(running))
+        with span("encode.concat", segments=len(segment_paths)):
+            concat_segments([segment_paths[n] for n in sorted(segment_paths)], output_file)
+        print(f"Video created successfully: {output_file}")
+        if srt_output:
+            SubtitleTimeline([texts[n] for n in sorted(texts)], manifest=AudioManifest.load(
+                os.path.join(audio_dir, "manifest.json")), offset=INTRO_DURATION).write_srt(srt_output)
+        if cache:
+            cache.evict(keep=keys)
+        print(f"Encoded: {', '.join(encoded) or 'nothing'}, {len(segment_paths) - len(encoded)} segments reused")
+        shutil.copyfile(script_path, snapshot_path)
+        succeeded = True
+        save_profile(profile_path)
+    finally:
+        # The stages stop at their next segment, the one being generated is finished first
+        stopped.set()
+        for stage in stages:
+            if stage.is_alive():
+                stage.join()
+        # The previous artifacts are only dropped once the new run went through, otherwise they are put back
+        for folder, previous in previous_dirs:
+            if previous and succeeded:
+                shutil.rmtree(previous, ignore_errors=True)
+            elif previous:
+                _restore(folder, previous)
+        frames.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_pipeline("scripts.json", "Samples/Videos/pipeline.mp4", "Samples/font/font.ttf", with_subtitles=True,
+                 tts_workers=2, encode_workers=2, srt_output="Samples/Subtitles/pipeline.srt",
+                 cache_dir="segment_cache", incremental=True)
@@ -0,0 +1,146 @@
+'''
+README : Content addressed cache of encoded segments.
+
+A segment is identified by the hash of everything that ends up in its pixels and samples: the bytes of its image and
+audio file, its title and subtitle text, the font, the video size, the frame rate, the effects and the encoder settings.
+When a script is re-rendered after editing one scene, only the segment of that scene gets a new key, every other segment
+is copied from the cache instead of being encoded again.
+
+The cache is a flat folder of `<key>.<container>` files. The modification time of a file is refreshed every time it is used,
+and the least recently used files are removed once the folder grows over its size limit. Sub folders aren't counted,
+the normalised frames kept in `<cache_dir>/frames` by `image_prep.ImagePrep` have their own limit.
+'''
+import hashlib
+import os
+import shutil
+
+from encoding_profiles import encoder_settings
+
+_file_digests = {}
+
+
+def file_digest(path):
+    """
+    Hashes the content of a file. Digests are remembered for the lifetime of the process, keyed on the path, size and
+    modification time of the file, so that a file shared by several segments (intro background, font) is read once.
+    Parameters:
+        path (str): Path of the file.
+    Returns:
+        str: Hex SHA-256 digest of the file.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
+
+
+def evict_lru(root, max_bytes, keep=()):
+    """
+    Removes the least recently used files of a flat cache folder until it fits in `max_bytes`. Files are named
+    `<key>.<extension>`, files still being written (`.part`) are neither counted nor removed.
+    Parameters:
+        root (str): Folder of the cache.
+        max_bytes (int): Size limit of the folder.
+        keep (iterable): Keys that must not be removed.
+    """
+    keep = set(keep)
+    entries = []
+    total = 0
+    with os.scandir(root) as listing:
+        for entry in listing:
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    for _, file_size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.basename(path).split(".")[0] in keep:
+            continue
+        os.remove(path)
+        total -= file_size
+
+
+class SegmentCache:
+    """
+    On disk cache of encoded segments with size based LRU eviction.
+    Parameters:
+        root (str): Folder holding the cached segments, created if missing.
+        max_bytes (int): Size limit of the folder, enforced by `evict`.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024**3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, spec, size, font_path, fps, settings=None):
+        """
+        Computes the cache key of a segment.
+        Parameters:
+            spec (SegmentSpec): Segment to render.
+            size (tuple): (width, height) of the video.
+            font_path (str): Path to the font used for titles and subtitles.
+            fps (int): Frame rate of the video.
+            settings (EncoderSettings): Codecs and encoder arguments of the segment, the `still` profile of `.mp4` files
+            by default.
+        Returns:
+            str: Hex SHA-256 digest identifying the encoded segment.
+        """
+        settings = settings or encoder_settings(".mp4", "still", fps)
+        parts = [
+            settings.cache_tag(),
+            f"{size[0]}x{size[1]}", str(fps),
+            file_digest(spec.image),
+            file_digest(spec.audio) if spec.audio else "silence",
+            repr(round(spec.duration, 6)), repr(spec.fade), repr(spec.title),
+            repr([(round(start, 6), round(end, 6), text) for start, end, text in spec.subtitles]),
+        ]
+        if not spec.is_still:
+            parts.append(file_digest(font_path))
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def path(self, key, extension=".mp4"):
+        return os.path.join(self.root, f"{key}{extension}")
+
+    def get(self, key, extension=".mp4"):
+        """
+        Looks up a segment and marks it as recently used.
+        Parameters:
+            key (str): Key of the segment.
+            extension (str): Container of the segment, the extension of the output file.
+        Returns:
+            str: Path of the cached segment, `None` on a miss.
+        """
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, segment_path):
+        """
+        Copies an encoded segment into the cache. The copy is written to a temporary name and renamed, so an
+        interrupted copy never leaves a truncated segment behind.
+        Returns:
+            str: Path of the cached segment.
+        """
+        path = self.path(key, os.path.splitext(segment_path)[1])
+        partial = f"{path}.{os.getpid()}.part"
+        shutil.copyfile(segment_path, partial)
+        os.replace(partial, path)
+        return path
+
+    def evict(self, keep=()):
+        """
+        Removes the least recently used segments until the cache fits in `max_bytes`.
+        Parameters:
+            keep (iterable): Keys that must not be removed, e.g. the segments of the video being rendered.
+        """
+        evict_lru(self.root, self.max_bytes, keep)
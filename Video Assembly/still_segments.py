@@ -0,0 +1,271 @@
+'''
+README : Still segment engine for the video assembler.
+
+Every scene of a ForgeTube video is a single still image held for the duration of its narration. Pushing such a scene
+through the MoviePy compositor means the same picture is re-composited and piped to ffmpeg `fps` times per second.
+This module renders every scene as an independent segment file instead:
+
+1. Scenes that only show an image (with the usual fade in / fade out) are encoded directly by ffmpeg from a looped image
+   input. The fades are done by ffmpeg's `fade` filter, so no frame ever goes through Python.
+2. Scenes whose pixels change for other reasons (title text, burnt-in subtitles) are still composited with MoviePy, but only
+   for that scene. Subtitles are blitted from pre-rendered bitmaps by `SubtitleOverlay`.
+
+All segments are encoded with identical codec parameters, from the encoding profile of the output file
+(`encoding_profiles`), so that they can be joined with ffmpeg's concat demuxer without re-encoding. Since segments are independent of each other, they can also be rendered in parallel, one process
+per segment, which MoviePy's single-threaded frame generation can't do for a single timeline.
+'''
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import numpy as np
+from moviepy import AudioClip, AudioFileClip, CompositeVideoClip, ImageClip, TextClip, vfx
+from moviepy.config import FFMPEG_BINARY
+from PIL import Image
+
+from encoding_profiles import AUDIO_CHANNELS, encoder_settings
+from subtitle_overlay import SubtitleOverlay
+from vfr import hold_static_frames, static_windows
+
+import _paths  # noqa: F401, adds diffusion/scripts to the import path
+from profiling import span
+
+@dataclass
+class SegmentSpec:
+    """
+    Describes one segment of the final video. Specs only hold paths and plain values so they can be hashed and
+    shipped to other processes.
+    Parameters:
+        image (str): Path to the still image shown during the segment.
+        duration (float): Duration of the segment in seconds.
+        audio (str): Path to the audio file of the segment, `None` for a silent segment.
+        title (str): Text shown in the center of the image (intro / outro), `None` for a regular scene.
+        subtitles (list): `(start, end, text)` tuples, relative to the start of the segment.
+        fade (float): Duration of the fade in and fade out effect, 0 disables it.
+    """
+    image: str
+    duration: float
+    audio: str = None
+    title: str = None
+    subtitles: list = field(default_factory=list)
+    fade: float = 1.0
+
+    @property
+    def is_still(self):
+        """`True` if the pixels of the segment only change because of the fades."""
+        return self.title is None and not self.subtitles
+
+
+def canvas_size(image_paths):
+    """
+    Computes the size of the video, same as the `compose` method of `concatenate_videoclips`: the largest width and
+    height among all the images. Only the image headers are read. Dimensions are rounded up to even numbers, as
+    required by yuv420p.
+    Parameters:
+        image_paths (list): Paths of all the images used in the video.
+    Returns:
+        tuple: (width, height) of the video.
+    """
+    width, height = 0, 0
+    for path in image_paths:
+        with Image.open(path) as img:
+            width = max(width, img.width)
+            height = max(height, img.height)
+    return width + width % 2, height + height % 2
+
+
+def run_ffmpeg(args):
+    cmd = [FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error", *args]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({' '.join(cmd)}):\n{result.stderr.decode(errors='replace')}")
+
+
+def render_still_segment(spec: SegmentSpec, output_path: str, size: tuple, fps: int = 24, threads: int = None,
+                         settings=None):
+    """
+    Encodes a still segment with ffmpeg only. The image is looped at the output frame rate, centered on a black
+    canvas of the video size and faded in and out, the same way the MoviePy path does it.
+    Parameters:
+        spec (SegmentSpec): Segment to render, must be a still segment.
+        output_path (str): Path of the encoded segment.
+        size (tuple): (width, height) of the video.
+        fps (int): Frame rate of the video.
+        threads (int): Number of encoder threads, `None` lets ffmpeg decide.
+        settings (EncoderSettings): Codecs and encoder arguments, the `still` profile of the output extension by default.
+    """
+    settings = settings or encoder_settings(output_path, "still", fps)
+    width, height = size
+    filters = [f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black"]
+    if spec.fade:
+        filters.append(f"fade=t=in:st=0:d={spec.fade}")
+        filters.append(f"fade=t=out:st={max(spec.duration - spec.fade, 0):.6f}:d={spec.fade}")
+    if settings.video_filter:
+        filters.append(settings.video_filter)
+
+    args = ["-loop", "1", "-framerate", str(fps), "-i", spec.image]
+    if spec.audio:
+        args += ["-i", spec.audio]
+    else:
+        args += ["-f", "lavfi", "-i", f"anullsrc=channel_layout=stereo:sample_rate={settings.audio_fps}"]
+    args += [
+        "-map", "0:v", "-map", "1:a",
+        "-vf", ",".join(filters),
+        "-t", f"{spec.duration:.6f}",
+        *settings.frame_rate_args(fps),
+        *settings.ffmpeg_args(),
+    ]
+    if threads:
+        args += ["-threads", str(threads)]
+    args.append(output_path)
+    run_ffmpeg(args)
+
+
+def _silence(duration, fps):
+    def frame_function(t):
+        return np.zeros((len(t), AUDIO_CHANNELS)) if np.ndim(t) else np.zeros(AUDIO_CHANNELS)
+
+    return AudioClip(frame_function, duration=duration, fps=fps)
+
+
+def render_composited_segment(spec: SegmentSpec, output_path: str, size: tuple, font_path: str, fps: int = 24,
+                              threads: int = None, settings=None):
+    """
+    Renders a segment whose pixels change over time (title text or subtitles) with MoviePy. Only this segment goes
+    through the compositor, at the full frame rate.
+    Parameters:
+        spec (SegmentSpec): Segment to render.
+        output_path (str): Path of the encoded segment.
+        size (tuple): (width, height) of the video.
+        font_path (str): Path to the True type or Open type font used for the text.
+        fps (int): Frame rate of the video.
+        threads (int): Number of encoder threads, `None` lets ffmpeg decide.
+        settings (EncoderSettings): Codecs and encoder arguments, the `still` profile of the output extension by default.
+    """
+    settings = settings or encoder_settings(output_path, "still", fps)
+    background = ImageClip(spec.image, duration=spec.duration)
+    if spec.fade:
+        background = background.with_effects([vfx.FadeIn(duration=spec.fade), vfx.FadeOut(duration=spec.fade)])
+    layers = [background.with_position("center")]
+    if spec.title is not None:
+        layers.append(TextClip(text=spec.title,
+                               font_size=70,
+                               color="white",
+                               font=font_path).with_position("center").with_duration(spec.duration))
+    clip = CompositeVideoClip(layers, size=size).with_duration(spec.duration)
+    if spec.subtitles:
+        clip = SubtitleOverlay(spec.subtitles, font_path).apply_to(clip)
+    if settings.variable_frame_rate:
+        # Held frames are composited once, the encoder drops the copies
+        clip, _ = hold_static_frames(clip, static_windows([(0, spec.duration, spec.fade)], spec.subtitles))
+
+    audio = AudioFileClip(spec.audio) if spec.audio else _silence(spec.duration, settings.audio_fps)
+    clip = clip.with_audio(audio.with_duration(spec.duration))
+    clip.write_videofile(output_path,
+                         fps=fps,
+                         threads=threads,
+                         logger=None,
+                         **settings.moviepy_args())
+    audio.close()
+    clip.close()
+
+
+def render_segment(spec: SegmentSpec, output_path: str, size: tuple, font_path: str, fps: int = 24,
+                   threads: int = None, settings=None):
+    """
+    Renders a single segment with the cheapest engine able to produce it. Defined at module level so that it can be
+    sent to worker processes.
+    Returns:
+        str: Path of the encoded segment.
+    """
+    if spec.is_still:
+        render_still_segment(spec, output_path, size, fps, threads, settings)
+    else:
+        render_composited_segment(spec, output_path, size, font_path, fps, threads, settings)
+    return output_path
+
+
+def concat_segments(segment_paths, output_file):
+    """
+    Joins encoded segments with ffmpeg's concat demuxer. Streams are copied, nothing is re-encoded.
+    Parameters:
+        segment_paths (list): Paths of the segments, in playback order.
+        output_file (str): Path of the final video.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            listing.write(f"file '{escaped}'\n")
+    try:
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", listing.name,
+                     "-c", "copy", "-movflags", "+faststart", output_file])
+    finally:
+        os.remove(listing.name)
+
+
+def render_segmented_video(specs, output_file, font_path, fps: int = 24, workers: int = 1, cache=None,
+                           profile="still", min_fps=None):
+    """
+    Renders every segment to a temporary folder and concatenates them into `output_file`.
+    With `workers` > 1 the segments are rendered in a `ProcessPoolExecutor`, longest segments first so that the
+    last worker to finish isn't stuck with a long scene. The CPU cores are split evenly between the workers' encoders.
+    With a `cache`, segments that were already encoded by a previous run are reused and only the others are rendered.
+    Parameters:
+        specs (list): `SegmentSpec` of every segment, in playback order.
+        output_file (str): Path of the final video.
+        font_path (str): Path to the font used for titles and subtitles.
+        fps (int): Frame rate of the video.
+        workers (int): Number of segments rendered at the same time.
+        cache (SegmentCache): Cache of encoded segments, `None` disables caching.
+        profile (str or EncodingProfile): Encoding profile, the codecs are picked from the extension of `output_file`.
+        min_fps (float): `None` for a constant frame rate, otherwise held stills are written at `min_fps` frames per
+        second with a variable frame rate (see `vfr.py`).
+    """
+    settings = encoder_settings(output_file, profile, fps, min_fps)
+    size = canvas_size([spec.image for spec in specs])
+    workdir = tempfile.mkdtemp(prefix="forgetube_segments_")
+    try:
+        segment_paths = [os.path.join(workdir, f"segment_{n:04d}{settings.extension}") for n in range(len(specs))]
+        keys = [cache.key(spec, size, font_path, fps, settings) for spec in specs] if cache else []
+        pending = []
+        for n in range(len(specs)):
+            cached_path = cache.get(keys[n], settings.extension) if cache else None
+            if cached_path:
+                segment_paths[n] = cached_path
+                print(f"Segment no. {n+1}/{len(specs)} reused from cache")
+            else:
+                pending.append(n)
+
+        def store(n):
+            if cache:
+                segment_paths[n] = cache.put(keys[n], segment_paths[n])
+
+        if workers > 1 and len(pending) > 1:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            order = sorted(pending, key=lambda n: specs[n].duration, reverse=True)
+            # Segments rendered by the workers are timed together, their spans would stay in the worker processes
+            frames = sum(round(specs[n].duration * fps) for n in pending)
+            with span("encode.segments", frames=frames, workers=workers), \
+                    ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(render_segment, specs[n], segment_paths[n], size, font_path, fps, threads,
+                                       settings): n
+                           for n in order}
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    store(futures[future])
+                    print(f"Segment no. {futures[future]+1} successfully rendered ({done}/{len(pending)})")
+        else:
+            for n in pending:
+                with span("encode.segment", frames=round(specs[n].duration * fps), still=specs[n].is_still):
+                    render_segment(specs[n], segment_paths[n], size, font_path, fps, settings=settings)
+                store(n)
+                print(f"Segment no. {n+1}/{len(specs)} successfully rendered")
+        with span("encode.concat", segments=len(segment_paths)):
+            concat_segments(segment_paths, output_file)
+        if cache:
+            cache.evict(keep=keys)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,119 @@
+'''
+README : Pre-rendered subtitle overlay.
+
+Burning subtitles in with one `TextClip` per chunk means that the final `CompositeVideoClip` goes through every subtitle
+clip for every output frame to check whether it is visible, so the cost of a frame grows with the number of subtitles.
+This module turns subtitles into a dedicated stage instead:
+1. Every distinct chunk of text is rasterised once into an RGBA bitmap (same styling as the `TextClip` it replaces),
+   only the last few bitmaps are kept.
+2. The cues are kept sorted by start time, the active cue of a frame is found with the previous lookup as a hint
+   (frames are requested in order, so this is O(1) per frame) and a binary search on a miss.
+3. The bitmap of the active cue is alpha blended straight onto the frame, at the bottom center of the video.
+'''
+from bisect import bisect_right
+from functools import lru_cache
+
+import numpy as np
+from moviepy import TextClip
+
+
+# Bitmaps kept at the same time. Cues are shown in time order, so only the recent chunks are ever asked for again,
+# an unbounded cache would hold a bitmap of every chunk of the video outside the memory budget of `create_video`
+SUBTITLE_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=SUBTITLE_CACHE_SIZE)
+def rasterize_subtitle(text, font_path, box_size=(1000, 100)):
+    """
+    Renders a subtitle chunk once. Identical chunks share the same bitmap while it is among the most recently used.
+    Parameters:
+        text (str): Text of the chunk.
+        font_path (str): Path to the True type or Open type font.
+        box_size (tuple): (width, height) of the subtitle box.
+    Returns:
+        tuple: (premultiplied RGB as uint16, inverse alpha as uint16, `True` if the bitmap is fully opaque)
+    """
+    clip = TextClip(text=text,
+                    font=font_path,
+                    color='white',
+                    bg_color='black',
+                    size=box_size,
+                    method='caption',
+                    text_align="center",
+                    horizontal_align="center")
+    rgb = np.ascontiguousarray(clip.get_frame(0)[:, :, :3], dtype=np.uint16)
+    if clip.mask is not None:
+        alpha = np.rint(clip.mask.get_frame(0) * 255).astype(np.uint16)[:, :, None]
+    else:
+        alpha = np.full(rgb.shape[:2] + (1,), 255, dtype=np.uint16)
+    clip.close()
+    return rgb * alpha, 255 - alpha, bool((alpha == 255).all())
+
+
+class SubtitleOverlay:
+    """
+    Blits pre-rendered subtitle bitmaps onto video frames.
+    Parameters:
+        cues (list): `(start, end, text)` tuples in seconds, sorted by start time and not overlapping.
+        font_path (str): Path to the True type or Open type font.
+    """
+
+    def __init__(self, cues, font_path):
+        cues = sorted(cues)
+        self.starts = [start for start, _, _ in cues]
+        self.ends = [end for _, end, _ in cues]
+        self.texts = [text for _, _, text in cues]
+        self.font_path = font_path
+        self._last = 0
+
+    def active(self, t):
+        """
+        Finds the cue shown at time `t`.
+        Returns:
+            int: Index of the active cue, `None` if no subtitle is shown.
+        """
+        n = self._last
+        for candidate in (n, n + 1):
+            if 0 <= candidate < len(self.starts) and self.starts[candidate] <= t < self.ends[candidate]:
+                self._last = candidate
+                return candidate
+        n = bisect_right(self.starts, t) - 1
+        if n >= 0 and t < self.ends[n]:
+            self._last = n
+            return n
+        return None
+
+    def blit(self, frame, t):
+        """
+        Draws the active subtitle, if any, at the bottom center of `frame`.
+        Parameters:
+            frame (numpy.ndarray): RGB frame of the video at time `t`, left untouched.
+            t (float): Time of the frame in seconds.
+        Returns:
+            numpy.ndarray: The frame with the subtitle drawn on a copy, or `frame` itself when no subtitle is shown.
+        """
+        n = self.active(t)
+        if n is None:
+            return frame
+        premultiplied, inverse_alpha, opaque = rasterize_subtitle(self.texts[n], self.font_path)
+        frame = np.array(frame, dtype=np.uint8)
+        frame_h, frame_w = frame.shape[:2]
+        box_h, box_w = premultiplied.shape[:2]
+        # Same placement as `with_position('bottom')`: horizontally centered, bottom aligned, clipped to the frame.
+        x, y = (frame_w - box_w) // 2, frame_h - box_h
+        fx0, fy0 = max(x, 0), max(y, 0)
+        fx1, fy1 = min(x + box_w, frame_w), min(y + box_h, frame_h)
+        bx0, by0 = fx0 - x, fy0 - y
+        bx1, by1 = bx0 + (fx1 - fx0), by0 + (fy1 - fy0)
+        region = frame[fy0:fy1, fx0:fx1]
+        if opaque:
+            region[:] = premultiplied[by0:by1, bx0:bx1] // 255
+        else:
+            region[:] = (premultiplied[by0:by1, bx0:bx1] + region * inverse_alpha[by0:by1, bx0:bx1]) // 255
+        return frame
+
+    def apply_to(self, clip):
+        """
+        Returns `clip` with the subtitles burnt in, as a single transform instead of one layer per subtitle.
+        """
+        return clip.transform(lambda get_frame, t: self.blit(get_frame(t), t))
@@ -0,0 +1,86 @@
+'''
+README : Subtitle timeline shared by the `.srt` file and the burnt-in subtitles.
+
+Subtitle timings used to be computed twice, once by `create_complete_srt` (which reloaded every audio file) and once
+inside `create_video`, with two copies of the chunking logic. `SubtitleTimeline` computes the cues once, from the audio
+durations or from the audio manifest, and every output is produced from that single list:
+- `write_srt` saves the `.srt` file,
+- `cues` feeds `SubtitleOverlay` for the whole video,
+- `scene_cues` gives the cues of one scene, relative to its start, for the segmented renderer.
+The `.srt` file and the burnt-in subtitles are therefore always identical.
+'''
+import pysrt
+
+
+def split_words(text, chunk_size=10):
+    """
+    Splits a subtitle text into chunks of at most `chunk_size` words.
+    Returns:
+        tuple: (words, list of (first word index, end word index, chunk text))
+    """
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size):
+        end = min(i + chunk_size, len(words))
+        chunks.append((i, end, " ".join(words[i:end])))
+    return words, chunks
+
+
+class SubtitleTimeline:
+    """
+    Subtitle cues of the whole video.
+    Parameters:
+        texts (list): Subtitle text of every scene.
+        durations (list): Duration of every scene in seconds, not needed with a `manifest`.
+        manifest (AudioManifest): Timing manifest of the audio stage, used instead of `durations` when given.
+        offset (float): Position of the first scene in the video (length of the intro clip).
+        chunk_size (int): Maximum number of words shown at once.
+    """
+
+    def __init__(self, texts, durations=None, manifest=None, offset=5, chunk_size=10):
+        self.scene_starts = []
+        self.scene_cue_lists = []
+        if manifest:
+            base = manifest.samples(offset)
+            for n, text in enumerate(texts[:len(manifest.segments)]):
+                start = base + manifest.segments[n].start_sample
+                self.scene_starts.append(manifest.seconds(start))
+                cues = manifest.cue_samples(n, text, chunk_size)
+                self.scene_cue_lists.append([(manifest.seconds(start + cue_start), manifest.seconds(start + cue_end),
+                                              chunk)
+                                             for cue_start, cue_end, chunk in cues])
+        else:
+            start = offset
+            for text, duration in zip(texts, durations):
+                words, chunks = split_words(text, chunk_size)
+                # Every boundary is computed from the start of the scene, so errors don't add up from chunk to chunk.
+                self.scene_starts.append(start)
+                self.scene_cue_lists.append([(start + duration * first / len(words), start + duration * end / len(words),
+                                              chunk)
+                                             for first, end, chunk in chunks])
+                start += duration
+        self.cues = [cue for scene in self.scene_cue_lists for cue in scene]
+
+    def scene_cues(self, n):
+        """
+        Cues of scene `n`, relative to the start of the scene.
+        Returns:
+            list: (start, end, text) tuples in seconds.
+        """
+        scene_start = self.scene_starts[n]
+        return [(start - scene_start, end - scene_start, text) for start, end, text in self.scene_cue_lists[n]]
+
+    def write_srt(self, outfile_path):
+        """
+        Saves the cues as an `.srt` file.
+        Parameters:
+            outfile_path (str): Path of the SRT file.
+        """
+        subs = pysrt.SubRipFile()
+        for start, end, text in self.cues:
+            subs.append(pysrt.SubRipItem(index=len(subs) + 1,
+                                         start=pysrt.SubRipTime(milliseconds=round(start * 1000)),
+                                         end=pysrt.SubRipTime(milliseconds=round(end * 1000)),
+                                         text=text))
+        subs.save(outfile_path)
+        print(f"File saved successfully at {outfile_path}")
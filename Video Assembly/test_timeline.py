@@ -0,0 +1,51 @@
+import numpy as np
+from moviepy import ColorClip, CompositeVideoClip, concatenate_videoclips
+
+from timeline import IndexedCompositeVideoClip, IntervalIndex, concatenate_indexed
+
+
+def test_interval_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    intervals = [(float(start), float(start + length)) for start, length in zip(rng.uniform(0, 50, 200),
+                                                                                 rng.uniform(0, 5, 200))]
+    intervals.append((10.0, None))
+    index = IntervalIndex(intervals)
+    for t in np.linspace(0, 60, 601):
+        expected = [n for n, (start, end) in enumerate(intervals) if start <= t and (end is None or t < end)]
+        assert index.query(t) == expected
+
+
+def test_indexed_composite_renders_like_composite():
+    # Layers smaller than the canvas make the composite transparent, which builds a mask
+    clips = [ColorClip((40, 30), color=(255, 0, 0), duration=2).with_position((0, 0)),
+             ColorClip((20, 20), color=(0, 255, 0), duration=1).with_start(0.5).with_position((10, 5))]
+    indexed = IndexedCompositeVideoClip(clips, size=(64, 48))
+    reference = CompositeVideoClip(clips, size=(64, 48))
+    assert isinstance(indexed.mask, IndexedCompositeVideoClip)
+    for t in (0, 0.75, 1.75):
+        assert np.array_equal(indexed.get_frame(t), reference.get_frame(t))
+        assert np.array_equal(indexed.mask.get_frame(t), reference.mask.get_frame(t))
+
+
+def test_concatenate_indexed_matches_compose():
+    clips = [ColorClip((64, 48), color=(255, 0, 0), duration=1),
+             ColorClip((32, 48), color=(0, 0, 255), duration=2)]
+    indexed = concatenate_indexed(clips)
+    reference = concatenate_videoclips(clips, method="compose")
+    assert indexed.duration == reference.duration
+    for t in (0.5, 1.5, 2.9):
+        assert np.array_equal(indexed.get_frame(t), reference.get_frame(t))
+
+
+def test_concatenate_indexed_shares_opaque_masks():
+    # Clips of the same size share one mask image instead of one per clip
+    clips = [ColorClip((64, 48), color=(255, 0, 0), duration=1) for _ in range(3)] + \
+        [ColorClip((32, 48), color=(0, 0, 255), duration=2)]
+    indexed = concatenate_indexed(clips)
+    reference = concatenate_videoclips(clips, method="compose")
+    masks = {id(clip.mask.img) for clip in indexed.clips}
+    assert len(masks) == 2
+    assert all(clip.mask is None for clip in clips)
+    for t in (0.5, 2.5, 3.5, 4.9):
+        assert np.array_equal(indexed.get_frame(t), reference.get_frame(t))
+        assert np.array_equal(indexed.mask.get_frame(t), reference.mask.get_frame(t))
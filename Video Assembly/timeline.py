@@ -0,0 +1,150 @@
+'''
+README : Timeline index for the video compositor.
+
+`CompositeVideoClip` finds the layers to draw at time `t` by asking every one of its clips whether it is playing, so the
+cost of every frame grows with the total number of layers of the video, most of which are not visible. For a long video
+concatenated with the `compose` method there is one layer per scene.
+
+`IntervalIndex` stores the (start, end) interval of every layer in a centered interval tree, built once from the sorted
+start and end arrays, and answers "which layers are active at `t`" in O(log n + k). Since the set of active layers only
+changes at the start or end of a layer, the answer of the last query is reused until `t` crosses the next boundary,
+which is the common case when frames are rendered in order.
+
+`IndexedCompositeVideoClip` is a drop-in `CompositeVideoClip` that uses the index to pick the layers of a frame.
+'''
+from bisect import bisect_right
+
+import numpy as np
+from moviepy import ColorClip, CompositeAudioClip, CompositeVideoClip
+
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+    def __init__(self, center, by_start, by_end, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+
+class IntervalIndex:
+    """
+    Static index of half-open intervals [start, end).
+    Parameters:
+        intervals (list): (start, end) tuples, `end` may be `None` for an interval that never ends.
+    """
+
+    def __init__(self, intervals):
+        self.starts = [start for start, _ in intervals]
+        self.ends = [float("inf") if end is None else end for _, end in intervals]
+        self.boundaries = sorted(set(self.starts) | set(self.ends))
+        # Empty intervals are never active, leaving them out also keeps the tree from splitting on them forever.
+        self._root = self._build([n for n in range(len(self.starts)) if self.starts[n] < self.ends[n]])
+        self._cached_slot = None
+        self._cached_result = []
+
+    def _build(self, members):
+        if not members:
+            return None
+        points = sorted(self.starts[n] for n in members)
+        center = points[len(points) // 2]
+        left, here, right = [], [], []
+        for n in members:
+            if self.ends[n] <= center:
+                left.append(n)
+            elif self.starts[n] > center:
+                right.append(n)
+            else:
+                here.append(n)
+        by_start = sorted(here, key=lambda n: self.starts[n])
+        by_end = sorted(here, key=lambda n: self.ends[n], reverse=True)
+        return _Node(center, by_start, by_end, self._build(left), self._build(right))
+
+    def _query(self, t):
+        found = []
+        node = self._root
+        while node is not None:
+            if t < node.center:
+                # Every interval of the node ends after the center, only the start has to be checked.
+                for n in node.by_start:
+                    if self.starts[n] > t:
+                        break
+                    found.append(n)
+                node = node.left
+            else:
+                # Every interval of the node starts at or before the center, only the end has to be checked.
+                for n in node.by_end:
+                    if self.ends[n] <= t:
+                        break
+                    found.append(n)
+                node = node.right
+        found.sort()
+        return found
+
+    def query(self, t):
+        """
+        Finds the intervals containing `t`.
+        Parameters:
+            t (float): Time in seconds.
+        Returns:
+            list: Indices of the active intervals, in the order they were given.
+        """
+        slot = bisect_right(self.boundaries, t)
+        if slot != self._cached_slot:
+            self._cached_slot = slot
+            self._cached_result = self._query(t)
+        return self._cached_result
+
+
+class IndexedCompositeVideoClip(CompositeVideoClip):
+    """
+    `CompositeVideoClip` that only fetches and composites the layers active at the time of the frame. Takes the same
+    arguments as `CompositeVideoClip`.
+    """
+
+    def __init__(self, clips, *args, **kwargs):
+        super().__init__(clips, *args, **kwargs)
+        self.index = IntervalIndex([(clip.start, clip.end) for clip in self.clips])
+        if isinstance(self.mask, CompositeVideoClip) and not isinstance(self.mask, IndexedCompositeVideoClip):
+            # Opaque black background like the mask built by CompositeVideoClip, without a color the mask would be
+            # transparent and build a mask of its own, and so on
+            self.mask = IndexedCompositeVideoClip(self.mask.clips, size=self.mask.size, is_mask=True, bg_color=0.0)
+
+    def playing_clips(self, t=0):
+        if not isinstance(t, (int, float, np.number)):
+            return super().playing_clips(t)
+        return [self.clips[n] for n in self.index.query(t)]
+
+
+def concatenate_indexed(clips, bg_color=None):
+    """
+    Same as `concatenate_videoclips(clips, method="compose")`, built on `IndexedCompositeVideoClip` so that the cost
+    of a frame doesn't depend on the number of clips.
+    Parameters:
+        clips (list): Clips to play one after the other.
+        bg_color (tuple): Color of the borders of the clips smaller than the video, black by default.
+    Returns:
+        VideoClip: The concatenated clip.
+    """
+    timings = np.cumsum([0] + [clip.duration for clip in clips])
+    if bg_color is None:
+        # The composite is transparent and CompositeVideoClip would give every clip without a mask a full size opaque
+        # mask image of its own, one per scene. Clips of the same size share a single one instead.
+        masks = {}
+        clips = list(clips)
+        for n, clip in enumerate(clips):
+            if clip.mask is None and clip.has_constant_size:
+                size = tuple(clip.size)
+                if size not in masks:
+                    masks[size] = ColorClip(size, 1.0, is_mask=True)
+                clips[n] = clip.with_mask(masks[size])
+    size = (max(clip.w for clip in clips), max(clip.h for clip in clips))
+    result = IndexedCompositeVideoClip([clip.with_start(t).with_position("center") for clip, t in zip(clips, timings)],
+                                       size=size,
+                                       bg_color=bg_color).with_duration(float(timings[-1]))
+    audios = [clip.audio.with_start(t) for clip, t in zip(clips, timings) if clip.audio is not None]
+    if audios:
+        result = result.with_audio(CompositeAudioClip(audios).with_duration(float(timings[-1])))
+    return result
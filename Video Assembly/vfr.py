@@ -0,0 +1,65 @@
+'''
+README : Variable frame rate rendering of slideshows.
+
+Almost every frame of a ForgeTube video is a copy of the previous one: a scene is a still image held for the duration
+of its narration, the picture only changes during the fades, at subtitle changes and at scene cuts. With a constant
+frame rate, MoviePy composites every one of these copies and ffmpeg encodes them all.
+In variable frame rate mode (`min_fps` of `create_video`):
+1. The timeline is split into static windows, the stretches between two changes of the picture (`static_windows`).
+2. `hold_static_frames` composites the first frame of a window and hands the same array back for the rest of the
+   window, so the compositor only runs for the frames that change.
+3. The encoder drops the repeated frames (`encoding_profiles.decimate_filter`) and writes the timestamps of the others,
+   keeping `min_fps` frames per second in held stills so that players and seeking behave.
+The still segment engine uses the same filter, its fades are already computed by ffmpeg.
+'''
+from bisect import bisect_right
+
+
+def static_windows(clips, cues=(), min_length=0.0):
+    """
+    Finds the windows of the timeline in which the picture doesn't change.
+    Parameters:
+        clips (list): `(start, duration, fade)` of every clip, in seconds. The picture of a clip only changes during its
+        fade in and fade out.
+        cues (list): `(start, end, text)` subtitle cues, in seconds. The picture changes when a cue starts or ends.
+        min_length (float): Windows shorter than this are dropped, e.g. one frame period.
+    Returns:
+        list: Sorted, non overlapping `(start, end)` windows.
+    """
+    cuts = sorted({time for start, end, _ in cues for time in (start, end)})
+    windows = []
+    for start, duration, fade in clips:
+        window_start, window_end = start + fade, start + duration - fade
+        inner = cuts[bisect_right(cuts, window_start):bisect_right(cuts, window_end)]
+        for a, b in zip([window_start, *inner], [*inner, window_end]):
+            if b - a > min_length:
+                windows.append((a, b))
+    return windows
+
+
+def hold_static_frames(clip, windows):
+    """
+    Computes a single frame per static window and returns it for every time of the window. Only the last frame is
+    kept, frames are expected to be requested in order, as `write_videofile` does.
+    Parameters:
+        clip (VideoClip): Clip to render.
+        windows (list): Static windows of the clip, see `static_windows`.
+    Returns:
+        tuple: (clip, dict with the number of frames "computed" and "held").
+    """
+    starts = [start for start, _ in windows]
+    stats = {"computed": 0, "held": 0}
+    last = {"window": None, "frame": None}
+
+    def held(get_frame, t):
+        n = bisect_right(starts, t) - 1
+        window = n if n >= 0 and t < windows[n][1] else None
+        if window is not None and window == last["window"]:
+            stats["held"] += 1
+            return last["frame"]
+        frame = get_frame(t)
+        stats["computed"] += 1
+        last["window"], last["frame"] = window, frame
+        return frame
+
+    return clip.transform(held), stats
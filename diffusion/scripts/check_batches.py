@@ -0,0 +1,90 @@
+import sys
+
+from image_batches import dispatch_scenes, run_batches
+
+# CHECKS THE BATCHING OF THE DIFFUSION SCENES WITHOUT A GPU
+# A fake pipeline tags every image with the prompt and the seed it was generated from, so the check can tell whether
+# each scene got its own image and its own seed back, in script order, once the scenes are regrouped into batches.
+# Usage: python check_batches.py, exits with an error if a check fails
+
+
+class TaggedImage:
+    def __init__(self, prompt, seed):
+        self.tag = f"{prompt}|{seed}"
+
+    def save(self, fp, format=None):
+        fp.write(self.tag.encode())
+
+
+class FakePipe:
+    # Same signature as StableDiffusionPipeline.__call__, records every call
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, negative_prompt, num_inference_steps, guidance_scale, width, height, generator):
+        assert len(prompt) == len(negative_prompt) == len(generator)
+        self.calls.append({"prompts": prompt, "seeds": [seed for _, seed in generator], "width": width,
+                           "height": height, "steps": num_inference_steps, "guidance_scale": guidance_scale})
+        return type("Output", (), {"images": [TaggedImage(p, seed) for p, (_, seed) in zip(prompt, generator)]})
+
+
+def make_scenes():
+    # Two sizes interleaved and a different step count, so batches don't follow the script order
+    scenes = []
+    for idx in range(9):
+        scenes.append({
+            "index": idx,
+            "scene_id": idx + 1,
+            "prompt": f"scene {idx}",
+            "negative_prompt": f"not {idx}",
+            "steps": 30 if idx != 4 else 50,
+            "guidance_scale": 7.5,
+            "width": 512 if idx % 2 else 768,
+            "height": 512,
+            "seed": None if idx == 7 else 1000 + idx,
+        })
+    return scenes
+
+
+def check_dispatch(scenes):
+    # Every scene reaches on_result once, with the image of its own batch, whatever the completion order
+    received = {}
+
+    def submit(batch):
+        return [f"{scene['prompt']}|{scene['seed']}".encode() for scene in batch]
+
+    def on_result(idx, scene, image_data, latency):
+        assert idx not in received
+        received[idx] = image_data
+
+    latencies, failed = dispatch_scenes(iter(scenes), submit, on_result, max_in_flight=2, max_batch_size=2)
+    assert failed == [] and sorted(latencies) == list(range(len(scenes)))
+    assert received == {idx: f"{scene['prompt']}|{scene['seed']}".encode() for idx, scene in enumerate(scenes)}
+
+
+def main():
+    scenes = make_scenes()
+    pipe = FakePipe()
+    results = run_batches(pipe, scenes, lambda seed: ("generator", seed), max_batch_size=2)
+
+    # Every scene gets the image of its own prompt and seed, at its own position
+    assert results == [f"scene {idx}|{scene['seed']}".encode() for idx, scene in enumerate(scenes)], results
+    # Every scene went through the pipeline exactly once
+    prompts = [p for call in pipe.calls for p in call["prompts"]]
+    assert sorted(prompts) == sorted(scene["prompt"] for scene in scenes), prompts
+    assert prompts != [scene["prompt"] for scene in scenes], "the scenes were never regrouped"
+    by_prompt = {scene["prompt"]: scene for scene in scenes}
+    for call in pipe.calls:
+        assert len(call["prompts"]) <= 2
+        # Each generator carries the seed of its own scene, and a batch only mixes compatible scenes
+        assert call["seeds"] == [by_prompt[p]["seed"] for p in call["prompts"]], call
+        for p in call["prompts"]:
+            scene = by_prompt[p]
+            assert (scene["width"], scene["height"], scene["steps"], scene["guidance_scale"]) == \
+                (call["width"], call["height"], call["steps"], call["guidance_scale"]), call
+    check_dispatch(scenes)
+    print(f"OK: {len(scenes)} scenes in {len(pipe.calls)} batches, order and seeds preserved")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
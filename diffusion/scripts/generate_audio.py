@@ -1,61 +1,199 @@
-from pydub import AudioSegment
 import json
-import io
+import multiprocessing
 import soundfile as sf
 import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import chain
 from kokoro.pipeline import KPipeline
+from profiling import save_profile, span
+from script_model import iter_audio
 
-def generate_audio(script_data):
+SAMPLE_RATE = 24000
+
+# Every worker process loads its own model, keep this small on machines with little memory
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Pipeline of the current process, created once by init_worker
+pipeline = None
+
+def init_worker(torch_threads=None):
+    global pipeline
+    if torch_threads:
+        # Workers share the CPU, without this every worker would start one torch thread per core
+        import torch
+        torch.set_num_threads(torch_threads)
     pipeline = KPipeline(lang_code='en')
-        
-    all_audio = []
-    for segment in script_data["audio_script"]:
-        speaker_id = "am_adam" if segment["speaker"] in ["default", "narrator_male"] else "af_heart"
-        audio = pipeline(text=segment["text"], voice=speaker_id, speed=segment["speed"])
-        
-        # Collect audio chunks
-        buffer = io.BytesIO()
-        for _, _, chunk in audio:
-            sf.write(buffer, chunk, 24000, format='WAV')
-        buffer.seek(0)
-        all_audio.append(buffer.read())
-    
-    return all_audio
 
-def merge_audio(audio_bytes_list):
-    # Create output directory
-    os.makedirs("output_audio", exist_ok=True)
+@dataclass
+class SynthesizedSegment:
+    # Mono float samples of one audio_script segment
+    audio: np.ndarray
+    sample_rate: int = SAMPLE_RATE
+    # Spoken words as {"text", "start", "end"}, in samples from the start of the segment
+    words: list = field(default_factory=list)
+
+    @property
+    def num_samples(self):
+        return len(self.audio)
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sample_rate
+
+    def timing(self):
+        return SegmentTiming(self.num_samples, self.words, self.sample_rate)
+
+@dataclass
+class SegmentTiming:
+    # What the manifest keeps of a segment once its samples are written
+    num_samples: int
+    words: list
+    sample_rate: int = SAMPLE_RATE
+
+def align_words(tokens, offset, sample_rate=SAMPLE_RATE):
+    # Turns the timed tokens of one pipeline chunk into words with sample boundaries.
+    # Tokens that aren't preceded by whitespace (punctuation, contractions) are glued to the previous word,
+    # tokens without timestamps take the boundaries of their neighbours.
+    words = []
+    glue = False
+    for token in tokens:
+        start = offset + round(token.start_ts * sample_rate) if token.start_ts is not None else None
+        end = offset + round(token.end_ts * sample_rate) if token.end_ts is not None else None
+        if words and glue:
+            words[-1]["text"] += token.text
+            if end is not None:
+                words[-1]["end"] = max(words[-1]["end"], end)
+        elif token.text.strip():
+            previous_end = words[-1]["end"] if words else offset
+            words.append({"text": token.text,
+                          "start": start if start is not None else previous_end,
+                          "end": end if end is not None else previous_end})
+        glue = not token.whitespace
+    return words
+
+def synthesize_segment(segment):
+    with span("tts.segment", index=segment.index) as record:
+        synthesized = _synthesize(segment)
+        record.frames = synthesized.num_samples
+    return synthesized
+
+def _synthesize(segment):
+    speaker_id = "am_adam" if segment.speaker in ["default", "narrator_male"] else "af_heart"
+    audio = pipeline(text=segment.text, voice=speaker_id, speed=segment.speed)
     
-    # Save segments locally
-    audio_files = []
-    for idx, audio_bytes in enumerate(audio_bytes_list):
-        output_path = f"output_audio/segment_{idx}.wav"
-        with open(output_path, "wb") as f:
-            f.write(audio_bytes)
-        audio_files.append(output_path)
+    # Collect audio chunks and join them once, writing every chunk to the same buffer
+    # produced one WAV header per chunk and only the first chunk was readable.
+    # The per-token timings of every chunk are kept, shifted by the length of the previous chunks.
+    chunks = []
+    words = []
+    offset = 0
+    for result in audio:
+        chunk = result.audio if hasattr(result, "audio") else result[2]
+        if chunk is None:
+            continue
+        chunk = np.asarray(chunk, dtype=np.float32)
+        words.extend(align_words(getattr(result, "tokens", None) or [], offset))
+        chunks.append(chunk)
+        offset += len(chunk)
+    samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    return SynthesizedSegment(samples, words=words)
+
+def load_segment(path, words=()):
+    # SynthesizedSegment of a segment written by a previous run, so an unchanged scene isn't synthesized again.
+    # Samples are kept as int16, they are written back bit for bit and the file keeps the same digest.
+    audio, sample_rate = sf.read(path, dtype="int16")
+    return SynthesizedSegment(audio, sample_rate, list(words))
+
+def generate_audio(segments, max_workers=1):
+    # Yields the SynthesizedSegment of every script segment, in order, as soon as it is ready.
+    # `segments` can be a lazy iterator (script_model.iter_audio), it is consumed as synthesis progresses.
+    # Segments are independent, with max_workers > 1 they are synthesized in parallel,
+    # each worker process loading the pipeline once, with at most 2 * max_workers segments queued.
+    if max_workers <= 1:
+        if pipeline is None:
+            init_worker()
+        for segment in segments:
+            yield synthesize_segment(segment)
+        return
     
-    # Merge audio files
-    master_audio = AudioSegment.empty()
-    for file in audio_files:
-        master_audio += AudioSegment.from_wav(file)
+    torch_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    # Spawned, not forked: the pool can be started from a thread (run_pipeline) while other threads hold torch locks
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(torch_threads,),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        queued = deque()
+        for segment in segments:
+            queued.append(pool.submit(synthesize_segment, segment))
+            if len(queued) >= 2 * max_workers:
+                yield queued.popleft().result()
+        while queued:
+            yield queued.popleft().result()
+
+def write_manifest(segments, manifest_path, segment_files=None):
+    # Timing manifest of the audio stage: exact sample count and start offset of every segment,
+    # so the assembler can plan the whole timeline in integer samples without decoding any audio.
+    # `segments` only needs sample_rate, num_samples and words, SegmentTiming or SynthesizedSegment.
+    sample_rate = segments[0].sample_rate if segments else SAMPLE_RATE
+    manifest = {"sample_rate": sample_rate, "total_samples": 0, "segments": []}
+    for idx, segment in enumerate(segments):
+        manifest["segments"].append({
+            "index": idx,
+            "file": segment_files[idx] if segment_files else None,
+            "start_sample": manifest["total_samples"],
+            "num_samples": segment.num_samples,
+            "words": segment.words,
+        })
+        manifest["total_samples"] += segment.num_samples
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+def merge_audio(segments, write_segments=True, output_dir="output_audio", master_output_path="master_output.wav",
+                on_segment=None):
+    # Streams every segment into one open WAV file, in a single pass: no temporary files are read back
+    # and the merged track is never copied as it grows.
+    # `segments` can be the generator returned by generate_audio, only the timing of a segment is kept
+    # once it is written, so memory doesn't grow with the length of the script.
+    # With write_segments, every segment is also saved as output_dir/segment_{idx}.wav for the assembler.
+    # The timing manifest is always written to output_dir/manifest.json.
+    # `on_segment(idx, file_path, segment)` is called as soon as a segment is written, file_path is None without
+    # write_segments.
+    os.makedirs(output_dir, exist_ok=True)
     
-    # Export final file
-    master_output_path = "master_output.wav"
-    master_audio.export(master_output_path, format="wav")
+    segments = iter(segments)
+    first = next(segments, None)
+    sample_rate = first.sample_rate if first else SAMPLE_RATE
+    timings = []
+    segment_files = []
+    with sf.SoundFile(master_output_path, "w", samplerate=sample_rate, channels=1, subtype="PCM_16") as master:
+        for idx, segment in enumerate(chain([first], segments) if first else ()):
+            if segment.sample_rate != sample_rate:
+                raise ValueError(f"Segment {idx} has a sample rate of {segment.sample_rate}, expected {sample_rate}")
+            master.write(segment.audio)
+            if write_segments:
+                segment_files.append(f"segment_{idx}.wav")
+                sf.write(os.path.join(output_dir, segment_files[-1]), segment.audio, sample_rate, subtype="PCM_16")
+            timings.append(segment.timing())
+            if on_segment:
+                on_segment(idx, os.path.join(output_dir, segment_files[-1]) if write_segments else None, segment)
+    write_manifest(timings, os.path.join(output_dir, "manifest.json"), segment_files)
     return master_output_path
 
 def main():
-    # Load script data
-    with open('scripts.json') as f:
-        script_data = json.load(f)
-    
-    # Generate audio
-    audio_bytes_list = generate_audio(script_data)
+    # Segments are read from the script lazily, synthesis starts before the whole file is parsed
+    segments = generate_audio(iter_audio('scripts.json'), max_workers=MAX_WORKERS)
     
-    # Merge and save final audio
-    final_path = merge_audio(audio_bytes_list)
+    # Merge and save final audio, each segment is written as soon as it is synthesized.
+    # The whole stage is timed here, the segments synthesized in worker processes aren't recorded one by one.
+    with span("tts", frames=0, workers=MAX_WORKERS) as record:
+        def count(idx, path, segment):
+            record.frames += segment.num_samples
+        final_path = merge_audio(segments, on_segment=count)
     
     print(f"Audio generation complete! Saved as {final_path}")
+    save_profile()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,104 +1,162 @@
 import modal
-import json
 import os
 import time
-from io import BytesIO
+from itertools import chain
+
+from image_batches import dispatch_scenes, run_batches
 
 image = modal.Image.debian_slim().pip_install(
     "diffusers",
     "torch",
     "transformers",
     "accelerate"
-)
+).add_local_python_source("image_batches")
 
 app = modal.App(name="finalgen_app")
 
-@app.function(image=image, gpu="A10G")
-def generate_image(prompt, negative_prompt="", steps=50, guidance_scale=12, width=1024, height=576, seed=None):
-    import torch
-    from diffusers import StableDiffusionPipeline
-
-
-# LOADS THE DIFFUSION PIPELINE
-
-    pipe = StableDiffusionPipeline.from_pretrained("runwayml/stable-diffusion-v1-5", torch_dtype=torch.float16)
-    pipe.to("cuda")
-
-    generator = torch.Generator(device="cuda").manual_seed(seed) if seed else None
+MODEL_ID = "runwayml/stable-diffusion-v1-5"
 
-    image = pipe(
-        prompt,
-        negative_prompt=negative_prompt,
-        num_inference_steps=steps,
-        guidance_scale=guidance_scale,
-        width=width,
-        height=height,
-        generator=generator
-    ).images[0]
 
-    img_byte_arr = BytesIO()
-    image.save(img_byte_arr, format="PNG")
-    img_byte_arr.seek(0)
+# SCENE PARAMETERS
 
-    return img_byte_arr.getvalue()
+def scene_params(segment):
+    # Plain dict sent to the Modal containers for one VisualSegment of the script
+    return {
+        "index": segment.index,
+        "scene_id": segment.scene_id,
+        "prompt": segment.prompt,
+        "negative_prompt": segment.negative_prompt,
+        "steps": segment.steps,
+        "guidance_scale": segment.guidance_scale,
+        "width": segment.width,
+        "height": segment.height,
+        "seed": segment.seed,
+    }
 
 
-# PATH TO JSON FILE
+# LOADS THE DIFFUSION PIPELINE ONCE PER CONTAINER
 
-json_path = "scripts.json"
-output_path = "imagedir/"
-os.makedirs(output_path, exist_ok=True)
+@app.cls(image=image, gpu="A10G")
+class ImageGenerator:
+    @modal.enter()
+    def load(self):
+        import torch
+        from diffusers import StableDiffusionPipeline
 
+        self.pipe = StableDiffusionPipeline.from_pretrained(MODEL_ID, torch_dtype=torch.float16)
+        self.pipe.to("cuda")
 
-# PROVIDE SOURCE TEXT OR PROMPT IN JSON FILE
+    def make_generator(self, seed):
+        import torch
 
-def main():
-    # JSON Decoding Error Handling
-    with open(json_path, "r", encoding="utf-8") as file:
-        try:
-            data = json.load(file)
-        except json.JSONDecodeError:
-            print("Error reading JSON file.")
-            return
-    # JSON Key Error Handling
-    if "visual_script" not in data:
-        print("Missing key in JSON.")
-        return
-    
+        generator = torch.Generator(device="cuda")
+        if seed is not None:
+            return generator.manual_seed(seed)
+        # Unseeded scenes still need their own generator inside a batch
+        generator.seed()
+        return generator
 
-# GENERATING THE IMAGES 
+    @modal.method()
+    def generate_batch(self, scenes):
+        return run_batches(self.pipe, scenes, self.make_generator)
 
-    with app.run():
-        # Looping Through the Scenes
-        for idx, scene in enumerate(data["visual_script"]):
-            try:
-                prompt = scene["prompt"]
-                timestamp = scene.get("timestamp", f"{idx:03d}")
-                negative_prompt = scene.get("negative_prompt", "")
-                steps = scene.get("steps", 50)
-                guidance_scale = scene.get("guidance_scale", 12)
-                width = scene.get("width", 1024)
-                height = scene.get("height", 576)
-                seed = scene.get("seed", None)
 
-                scene_id = timestamp.replace(":", "-")
+# PATH TO JSON FILE
 
-                image_data = generate_image.remote(prompt, negative_prompt, steps, guidance_scale, width, height, seed)
+json_path = "scripts.json"
+output_path = "imagedir/"
 
 
 # SAVING THE IMAGES IN THE OUTPUT DIRECTORY
 
-                file_path = os.path.join(output_path, f"scene_{scene_id}.png")
-                with open(file_path, "wb") as f:
-                    f.write(image_data)
+def save_image(scene, image_data):
+    file_path = os.path.join(output_path, f"scene_{scene['scene_id']}.png")
+    with open(file_path, "wb") as f:
+        f.write(image_data)
+    return file_path
+
+
+# REUSING THE IMAGES OF SCENES THAT DIDN'T CHANGE SINCE THE LAST RUN, GENERATING THE OTHERS
+
+def generate_images(segments, on_saved=None):
+    # Saves the image of every VisualSegment in `segments`, which can be a lazy iterator (script_model.iter_visual):
+    # the first batches are on the GPU before the whole script is parsed.
+    # `on_saved(index, file_path)` is called as soon as the image of the segment at `index` is on disk, cached or not.
+    # Returns the number of scenes, the latency of every generated scene and the ids of the scenes that failed.
+
+    # Only used locally, the Modal containers never touch the cache or the profiler
+    from image_cache import ImageCache
+    from profiling import span
+
+    os.makedirs(output_path, exist_ok=True)
+    cache = ImageCache()
+    scene_count = 0
+    pending = []
+
+    def pending_scenes():
+        nonlocal scene_count
+        for segment in segments:
+            scene = scene_params(segment)
+            scene_count += 1
+            image_data = cache.get(cache.key(scene, MODEL_ID))
+            if image_data is None:
+                pending.append(scene)
+                yield scene
+            else:
+                file_path = save_image(scene, image_data)
+                print(f"Cached: {file_path}")
+                if on_saved:
+                    on_saved(segment.index, file_path)
+
+    # Each image is saved as soon as its batch is done
+    def on_result(idx, scene, image_data, latency):
+        cache.put(cache.key(scene, MODEL_ID), image_data)
+        file_path = save_image(scene, image_data)
+        print(f"Saved: {file_path} ({latency:.1f}s)")
+        if on_saved:
+            on_saved(scene["index"], file_path)
+
+    latencies, failed = {}, []
+    scenes = pending_scenes()
+    try:
+        with span("diffusion") as record:
+            # The Modal app is only started once a scene actually needs the GPU
+            first = next(scenes, None)
+            if first is not None:
+                with app.run():
+                    latencies, failed = dispatch_scenes(chain([first], scenes),
+                                                        ImageGenerator().generate_batch.remote, on_result)
+            record.frames = len(latencies)
+    finally:
+        cache.evict()
+    return (scene_count,
+            {pending[idx]["scene_id"]: latency for idx, latency in latencies.items()},
+            [pending[idx]["scene_id"] for idx in failed])
 
-                print(f"Saved: {file_path}")
 
-                time.sleep(2)
+# PROVIDE SOURCE TEXT OR PROMPT IN JSON FILE
 
-            except Exception as e:
-                print(f"Error processing scene {idx}: {e}")
+def main():
+    from profiling import save_profile
+    from script_model import ScriptError, iter_visual
+
+    start = time.perf_counter()
+    try:
+        scene_count, latencies, failed = generate_images(iter_visual(json_path))
+    except (FileNotFoundError, ScriptError) as e:
+        print(f"Error reading JSON file: {e}")
+        return
+    if not scene_count:
+        print("Missing key in JSON.")
+        return
 
+    print(f"{scene_count - len(latencies) - len(failed)} scenes reused from the cache, {len(latencies)} generated")
+    if latencies:
+        print(f"Generated {len(latencies)} scenes in {time.perf_counter() - start:.1f}s "
+              f"(slowest scene {max(latencies.values()):.1f}s)")
+    if failed:
+        print(f"Failed scenes: {failed}")
+    save_profile()
     print("Done.")
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import re
 import google.generativeai as genai
 from typing import Dict, List, Optional
 from serpapi import GoogleSearch
+from profiling import profiled, save_profile
 
 class VideoScriptGenerator:
     def __init__(self, api_key: str, serp_api_key: str):
@@ -196,6 +197,7 @@ class VideoScriptGenerator:
  if you do as instructed you will be awarded with 100 dollars with each sucessful  call
         """
     
+    @profiled("script.search_web")
     def _search_web(self, query: str) -> str:
         try:
             params = {
@@ -216,6 +218,7 @@ class VideoScriptGenerator:
         script["additional_context"] = web_context
         return script
     
+    @profiled("script.generate_content")
     def _generate_content(self, prompt: str, system_prompt: str) -> str:
         try:
             response = self.model.generate_content(contents=[system_prompt, prompt])
@@ -236,6 +239,7 @@ class VideoScriptGenerator:
             except Exception as e:
                 raise ValueError(f"JSON extraction failed: {str(e)}")
     
+    @profiled("script.generate")
     def generate_script(self, topic: str, duration: int = 60, key_points: Optional[List[str]] = None) -> Dict:
         web_context = self._search_web(topic)
         initial_prompt = f"""Generate an initial video script outline for a {duration}-second video about: {topic}.
@@ -260,6 +264,7 @@ class VideoScriptGenerator:
         
         return segmented_script
     
+    @profiled("script.refine")
     def refine_script(self, existing_script: Dict, feedback: str) -> Dict:
         prompt = f"""Refine this script based on feedback:
         Existing Script: {json.dumps(existing_script, indent=2)}
@@ -294,4 +299,4 @@ if __name__ == "__main__":
             generator.save_script(script, "scripts.json")
     except Exception as e:
         print(f"Script generation failed: {str(e)}")
-        
+    save_profile()
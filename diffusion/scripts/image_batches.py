@@ -0,0 +1,120 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from io import BytesIO
+
+# BATCHING AND DISPATCH OF THE DIFFUSION SCENES
+# Kept out of generate_image.py, which defines the Modal app on import: this module only needs the standard library, so
+# the batching logic can be checked without Modal or a GPU (check_batches.py). The Modal image ships it to the
+# containers, where ImageGenerator calls run_batches.
+
+MAX_BATCH_SIZE = 4
+MAX_IN_FLIGHT = 8
+RETRIES = 3
+BACKOFF = 2.0
+
+
+# GROUPS OF COMPATIBLE SCENES
+
+def iter_batches(scenes, max_batch_size=MAX_BATCH_SIZE):
+    # Scenes can only share a pipeline call if they have the same size, steps and guidance scale.
+    # Yields lists of (idx, scene) as soon as a group is full, so `scenes` can be a lazy iterator,
+    # the groups that aren't full are flushed once every scene has been read.
+    groups = {}
+    for idx, scene in enumerate(scenes):
+        key = (scene["width"], scene["height"], scene["steps"], scene["guidance_scale"])
+        group = groups.setdefault(key, [])
+        group.append((idx, scene))
+        if len(group) == max_batch_size:
+            yield groups.pop(key)
+    yield from groups.values()
+
+
+def group_scenes(scenes, max_batch_size=MAX_BATCH_SIZE):
+    # Indices of the scenes of every batch
+    return [[idx for idx, _ in batch] for batch in iter_batches(scenes, max_batch_size)]
+
+
+def to_png(img):
+    img_byte_arr = BytesIO()
+    img.save(img_byte_arr, format="PNG")
+    return img_byte_arr.getvalue()
+
+
+def run_batches(pipe, scenes, make_generator, max_batch_size=MAX_BATCH_SIZE):
+    # Runs every scene through an already loaded pipeline, one call per batch of compatible scenes.
+    # `pipe` can be any callable with the StableDiffusionPipeline signature, e.g. a stub for local testing.
+    # Returns the PNG bytes of every scene, in the same order as `scenes`.
+    results = [None] * len(scenes)
+    for batch in group_scenes(scenes, max_batch_size):
+        first = scenes[batch[0]]
+        images = pipe(
+            [scenes[idx]["prompt"] for idx in batch],
+            negative_prompt=[scenes[idx]["negative_prompt"] for idx in batch],
+            num_inference_steps=first["steps"],
+            guidance_scale=first["guidance_scale"],
+            width=first["width"],
+            height=first["height"],
+            generator=[make_generator(scenes[idx]["seed"]) for idx in batch]
+        ).images
+        for idx, img in zip(batch, images):
+            results[idx] = to_png(img)
+    return results
+
+
+# CONCURRENT DISPATCH OF THE BATCHES
+
+def submit_with_retry(submit, batch, retries=RETRIES, backoff=BACKOFF):
+    # Calls `submit(batch)`, retrying with exponential backoff. Returns the result and the latency of the successful call
+    from profiling import span
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            with span("diffusion.batch", frames=len(batch), attempt=attempt):
+                result = submit(batch)
+            return result, time.perf_counter() - start
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Batch failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+
+def dispatch_scenes(scenes, submit, on_result, max_in_flight=MAX_IN_FLIGHT, retries=RETRIES, backoff=BACKOFF,
+                    max_batch_size=MAX_BATCH_SIZE):
+    # Submits the batches of scenes as they are formed, with at most `max_in_flight` calls running at the same time.
+    # `scenes` can be a lazy iterator of scene dicts, it is only read ahead while a call slot is free.
+    # `submit` takes a list of scene dicts and returns their PNG bytes, e.g. ImageGenerator().generate_batch.remote
+    # `on_result(idx, scene, image_data, latency)` is called as soon as a batch completes, in completion order.
+    # Returns the latency of every generated scene and the indices of the scenes that failed.
+    latencies = {}
+    failed = []
+
+    def collect(future, batch):
+        try:
+            images, latency = future.result()
+        except Exception as e:
+            for idx, _ in batch:
+                print(f"Error processing scene {idx}: {e}")
+            failed.extend(idx for idx, _ in batch)
+            return
+        for (idx, scene), image_data in zip(batch, images):
+            latencies[idx] = latency
+            on_result(idx, scene, image_data, latency)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        running = {}
+        try:
+            for batch in iter_batches(scenes, max_batch_size):
+                if len(running) >= max_in_flight:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, running.pop(future))
+                future = pool.submit(submit_with_retry, submit, [scene for _, scene in batch], retries, backoff)
+                running[future] = batch
+        finally:
+            # Batches already submitted are still saved if reading the scenes fails half way
+            for future in as_completed(running):
+                collect(future, running[future])
+    return latencies, sorted(failed)
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+
+# ON DISK CACHE OF GENERATED IMAGES
+# A scene is identified by the hash of the model id and every parameter that changes the image it produces.
+# Re-running a script after a few scenes changed only sends those scenes to the GPU, every other image is read back
+# from the cache. The least recently used images are removed once the cache grows over its size limit.
+
+CACHE_KEYS = ("prompt", "negative_prompt", "steps", "guidance_scale", "width", "height", "seed")
+
+
+class ImageCache:
+    def __init__(self, root="image_cache", max_bytes=1024**3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, scene, model_id):
+        # Unseeded scenes are random on every run, they are never cached
+        if scene.get("seed") is None:
+            return None
+        params = {name: scene[name] for name in CACHE_KEYS}
+        params["model_id"] = model_id
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.png")
+
+    def get(self, key):
+        # Returns the cached PNG bytes and marks the image as recently used, None on a miss
+        if key is None:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, image_data):
+        # Written to a temporary name first so that an interrupted run never leaves a truncated image behind
+        if key is None:
+            return
+        partial = f"{self.path(key)}.{os.getpid()}.part"
+        with open(partial, "wb") as f:
+            f.write(image_data)
+        os.replace(partial, self.path(key))
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.root) as listing:
+            for entry in listing:
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,231 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    # Optional, memory of the child processes (ffmpeg, worker pools) is only counted with psutil
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# LIGHTWEIGHT STAGE PROFILER
+# Every stage of the pipeline (script generation, TTS, diffusion, clip construction, compositing, encoding) is wrapped
+# in a span. A span records its wall time, the CPU time of the thread that ran it (stages running at the same time in
+# other threads aren't counted, work done in worker processes isn't either), the peak resident memory of the process and
+# of its children while the span was open, and its throughput when the stage knows how many frames or samples it
+# produced. Memory is sampled every SAMPLE_INTERVAL seconds by a background thread that only runs while spans are open.
+# save_profile writes the spans as JSON, with a per stage summary, and as a Chrome trace that can be opened in
+# chrome://tracing or https://ui.perfetto.dev
+#
+#   with span("tts.segment") as s:
+#       ...
+#       s.frames = len(samples)
+#
+#   @profiled("script.generate_content")
+#   def _generate_content(...):
+#
+# Spans recorded in worker processes stay in those processes, stages that use a process pool are timed as a whole.
+
+# Setting FORGETUBE_PROFILE=profile.json makes the scripts save their profile there when they finish
+PROFILE_PATH = os.environ.get("FORGETUBE_PROFILE")
+
+# Seconds between two memory samples
+SAMPLE_INTERVAL = 0.05
+
+_spans = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+# Spans being timed, updated by the memory sampler
+_open = set()
+_sampler = None
+
+
+def _rss_mb():
+    # Current resident memory of the process and of all its children, None when it can't be read
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total / (1024 * 1024)
+        except psutil.Error:
+            return None
+    try:
+        # Linux without psutil, the process only
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _sample():
+    global _sampler
+    while True:
+        rss = _rss_mb()
+        with _lock:
+            if not _open:
+                _sampler = None
+                return
+            for record in _open:
+                record.observe(rss)
+        time.sleep(SAMPLE_INTERVAL)
+
+
+def _track(record):
+    global _sampler
+    with _lock:
+        _open.add(record)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name="profiling-sampler", daemon=True)
+            _sampler.start()
+
+
+class Span:
+    __slots__ = ("name", "start", "wall", "cpu", "peak_rss_mb", "frames", "thread", "args")
+
+    def __init__(self, name, frames=None, **args):
+        self.name = name
+        self.start = None
+        self.wall = None
+        # CPU time of the thread that ran the span
+        self.cpu = None
+        # Highest resident memory of the process and its children sampled while the span was open
+        self.peak_rss_mb = None
+        # Frames, samples or images produced by the stage, used for the throughput
+        self.frames = frames
+        self.thread = threading.current_thread().name
+        self.args = args
+
+    def observe(self, rss):
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, round(rss, 1))
+
+    @property
+    def fps(self):
+        return self.frames / self.wall if self.frames and self.wall else None
+
+    def to_dict(self):
+        return {"name": self.name, "start": round(self.start, 6), "wall": round(self.wall, 6),
+                "cpu": round(self.cpu, 6), "peak_rss_mb": self.peak_rss_mb, "frames": self.frames,
+                "fps": round(self.fps, 2) if self.fps else None, "thread": self.thread, **self.args}
+
+
+@contextmanager
+def span(name, frames=None, **args):
+    # Times the body of the `with` block, extra keyword arguments are stored with the span
+    record = Span(name, frames, **args)
+    record.observe(_rss_mb())
+    _track(record)
+    start_cpu = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.wall = time.perf_counter() - start
+        record.cpu = time.thread_time() - start_cpu
+        record.start = start - _origin
+        record.observe(_rss_mb())
+        with _lock:
+            _open.discard(record)
+            _spans.append(record)
+
+
+def add_span(name, wall, cpu=0.0, frames=None, **args):
+    # Records time that was measured by the caller, e.g. the sum of many short calls spread over a longer stage
+    record = Span(name, frames, **args)
+    record.start = time.perf_counter() - _origin - wall
+    record.wall = wall
+    record.cpu = cpu
+    # The span wasn't open while the work was done, only the memory at the time it is recorded is known
+    record.observe(_rss_mb())
+    with _lock:
+        _spans.append(record)
+    return record
+
+
+def profiled(name):
+    # Decorator version of span
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+def summary():
+    # Totals per span name, slowest stage first
+    stages = {}
+    for record in spans():
+        stage = stages.setdefault(record.name, {"count": 0, "wall": 0.0, "cpu": 0.0, "frames": 0,
+                                                "peak_rss_mb": None})
+        stage["count"] += 1
+        stage["wall"] += record.wall
+        stage["cpu"] += record.cpu
+        stage["frames"] += record.frames or 0
+        if record.peak_rss_mb is not None:
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0, record.peak_rss_mb)
+    for stage in stages.values():
+        stage["fps"] = round(stage["frames"] / stage["wall"], 2) if stage["frames"] and stage["wall"] else None
+        stage["wall"] = round(stage["wall"], 6)
+        stage["cpu"] = round(stage["cpu"], 6)
+    return dict(sorted(stages.items(), key=lambda item: item[1]["wall"], reverse=True))
+
+
+def print_summary():
+    print(f"{'stage':<32}{'count':>7}{'wall s':>10}{'cpu s':>10}{'fps':>10}{'peak MB':>10}")
+    for name, stage in summary().items():
+        fps = f"{stage['fps']:.1f}" if stage["fps"] else "-"
+        rss = f"{stage['peak_rss_mb']:.0f}" if stage["peak_rss_mb"] is not None else "-"
+        print(f"{name:<32}{stage['count']:>7}{stage['wall']:>10.2f}{stage['cpu']:>10.2f}{fps:>10}{rss:>10}")
+
+
+def chrome_trace():
+    # Trace Event Format, one complete ("X") event per span, in microseconds
+    threads = {}
+    events = []
+    for record in spans():
+        tid = threads.setdefault(record.thread, len(threads) + 1)
+        events.append({"name": record.name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                       "ts": round(record.start * 1e6), "dur": round(record.wall * 1e6),
+                       "args": {key: value for key, value in record.to_dict().items()
+                                if key not in ("name", "start", "wall", "thread")}})
+    for thread, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def save_profile(path=None):
+    # Writes `path` (spans and per stage summary) and the Chrome trace next to it, as <name>.trace.json, then clears the
+    # spans so that the next profile of the same process starts empty
+    path = path or PROFILE_PATH
+    if not path:
+        return None
+    with open(path, "w") as f:
+        json.dump({"summary": summary(), "spans": [record.to_dict() for record in spans()]}, f, indent=2)
+    trace_path = os.path.splitext(path)[0] + ".trace.json"
+    with open(trace_path, "w") as f:
+        json.dump(chrome_trace(), f)
+    print_summary()
+    print(f"Profile saved to {path} and {trace_path}")
+    reset()
+    return path
@@ -0,0 +1,76 @@
+import sys
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
+from script_model import load_script
+
+
+# SCENE BY SCENE DIFF OF TWO VERSIONS OF A SCRIPT
+# When refine_script returns an updated script, most scenes are usually untouched. diff_scripts compares the new version
+# with the one that was last built and marks as dirty only the segments whose narration or image parameters changed.
+# Segments are aligned like the lines of a text diff, so inserting or removing a scene doesn't dirty every scene after
+# it: an unchanged segment is reused from its old position, whatever its new index or timestamp.
+
+# Everything that changes the audio of a segment
+AUDIO_FIELDS = ("text", "speaker", "speed", "pitch", "emotion")
+# Everything that changes the image of a segment
+VISUAL_FIELDS = ("prompt", "negative_prompt", "style", "guidance_scale", "steps", "seed", "width", "height")
+
+
+def match_segments(old_segments, new_segments, fields):
+    # Maps the index of every unchanged new segment to the index of the same segment in the old script
+    signature = lambda segment: tuple(getattr(segment, name) for name in fields)
+    matcher = SequenceMatcher(None, [signature(s) for s in old_segments], [signature(s) for s in new_segments],
+                              autojunk=False)
+    reuse = {}
+    for block in matcher.get_matching_blocks():
+        for k in range(block.size):
+            reuse[block.b + k] = block.a + k
+    return reuse
+
+
+@dataclass
+class ScriptDiff:
+    # new index -> old index of the segments that can be reused
+    audio_reuse: dict
+    visual_reuse: dict
+    audio_count: int
+    visual_count: int
+
+    @property
+    def dirty_audio(self):
+        return [n for n in range(self.audio_count) if n not in self.audio_reuse]
+
+    @property
+    def dirty_visual(self):
+        return [n for n in range(self.visual_count) if n not in self.visual_reuse]
+
+    @property
+    def dirty_scenes(self):
+        # A scene has to be encoded again if its audio or its image changed
+        return sorted(set(self.dirty_audio) | set(self.dirty_visual))
+
+    def report(self):
+        scenes = lambda indices: ", ".join(str(n + 1) for n in indices) or "none"
+        return (f"Audio to regenerate: {scenes(self.dirty_audio)} ({len(self.audio_reuse)} reused)\n"
+                f"Images to regenerate: {scenes(self.dirty_visual)} ({len(self.visual_reuse)} reused)\n"
+                f"Scenes to rebuild: {scenes(self.dirty_scenes)}")
+
+
+def diff_scripts(old, new):
+    # Compares two Script objects, `old` being the last version that was built
+    return ScriptDiff(audio_reuse=match_segments(old.audio, new.audio, AUDIO_FIELDS),
+                      visual_reuse=match_segments(old.visual, new.visual, VISUAL_FIELDS),
+                      audio_count=len(new.audio),
+                      visual_count=len(new.visual))
+
+
+def main():
+    # python script_diff.py previous_script.json scripts.json
+    if len(sys.argv) != 3:
+        print("Usage: python script_diff.py <previous script> <new script>")
+        return
+    print(diff_scripts(load_script(sys.argv[1]), load_script(sys.argv[2])).report())
+
+if __name__ == "__main__":
+    main()
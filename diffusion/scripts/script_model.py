@@ -0,0 +1,254 @@
+import json
+from dataclasses import dataclass
+
+try:
+    # Optional, lets the segments of a large .json script be read without loading the whole document
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# SHARED SCRIPT MODEL
+# The script JSON written by generate_script.py is parsed once into these classes and reused by every stage
+# (image generation, audio generation, video assembly). Numeric fields are converted and timestamps parsed at load
+# time, so a malformed script fails right away with a ScriptError instead of printing an error and returning None
+# somewhere down the pipeline.
+#
+# Long scripts can be streamed instead of loaded: iter_audio and iter_visual yield one segment at a time, so a stage can
+# start working on the first segments before the rest of the file is parsed. Streaming works best with the line
+# delimited variant of the script (see Samples/templates/template.jsonl), one JSON object per line:
+#   {"topic": "...", "description": "..."}        header, optional
+#   {"type": "audio", "text": "...", ...}         one audio_script segment
+#   {"type": "visual", "prompt": "...", ...}      one visual_script segment
+# Plain .json scripts are streamed with ijson when it is installed, and loaded at once otherwise.
+
+
+class ScriptError(ValueError):
+    pass
+
+
+def parse_timestamp(value):
+    # "MM:SS" or "HH:MM:SS" to seconds, None if the segment has no timestamp
+    if value is None:
+        return None
+    try:
+        seconds = 0.0
+        for part in str(value).split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        raise ScriptError(f"Invalid timestamp {value!r}")
+
+
+def _number(item, key, default, cast, where):
+    value = item.get(key, default)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ScriptError(f"{where}: {key} must be a number, got {value!r}")
+
+
+@dataclass(slots=True, frozen=True)
+class AudioSegment:
+    index: int
+    text: str
+    timestamp: str = None
+    start: float = None
+    speaker: str = "default"
+    speed: float = 1.0
+    pitch: float = 1.0
+    emotion: str = "neutral"
+
+    @classmethod
+    def from_dict(cls, index, item):
+        where = f"audio_script[{index}]"
+        if not isinstance(item, dict):
+            raise ScriptError(f"{where} must be an object")
+        if not item.get("text"):
+            raise ScriptError(f"{where} has no text")
+        return cls(index=index,
+                   text=item["text"],
+                   timestamp=item.get("timestamp"),
+                   start=parse_timestamp(item.get("timestamp")),
+                   speaker=item.get("speaker", "default"),
+                   speed=_number(item, "speed", 1.0, float, where),
+                   pitch=_number(item, "pitch", 1.0, float, where),
+                   emotion=item.get("emotion", "neutral"))
+
+
+@dataclass(slots=True, frozen=True)
+class VisualSegment:
+    index: int
+    prompt: str
+    timestamp: str = None
+    start: float = None
+    end: float = None
+    negative_prompt: str = ""
+    style: str = None
+    guidance_scale: float = 12.0
+    steps: int = 50
+    seed: int = None
+    width: int = 1024
+    height: int = 576
+
+    @property
+    def scene_id(self):
+        # Name used for the generated image, scene_{scene_id}.png
+        return self.timestamp.replace(":", "-") if self.timestamp else f"{self.index:03d}"
+
+    @classmethod
+    def from_dict(cls, index, item):
+        where = f"visual_script[{index}]"
+        if not isinstance(item, dict):
+            raise ScriptError(f"{where} must be an object")
+        # Older mock scripts use image_prompt
+        prompt = item.get("prompt") or item.get("image_prompt")
+        if not prompt:
+            raise ScriptError(f"{where} has no prompt")
+        timestamp = item.get("timestamp", item.get("timestamp_start"))
+        return cls(index=index,
+                   prompt=prompt,
+                   timestamp=timestamp,
+                   start=parse_timestamp(timestamp),
+                   end=parse_timestamp(item.get("timestamp_end")),
+                   negative_prompt=item.get("negative_prompt", ""),
+                   style=item.get("style"),
+                   guidance_scale=_number(item, "guidance_scale", 12.0, float, where),
+                   steps=_number(item, "steps", 50, int, where),
+                   seed=_number(item, "seed", None, int, where),
+                   width=_number(item, "width", 1024, int, where),
+                   height=_number(item, "height", 576, int, where))
+
+
+@dataclass(slots=True, frozen=True)
+class Script:
+    topic: str
+    audio: tuple
+    visual: tuple
+    description: str = ""
+
+    @property
+    def subtitles(self):
+        return [segment.text for segment in self.audio]
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ScriptError("The script must be a JSON object")
+        audio_script = data.get("audio_script", [])
+        visual_script = data.get("visual_script", [])
+        if not isinstance(audio_script, list) or not isinstance(visual_script, list):
+            raise ScriptError("audio_script and visual_script must be lists")
+        return cls(topic=data.get("topic", "No topic found"),
+                   description=data.get("description", ""),
+                   audio=tuple(AudioSegment.from_dict(idx, item) for idx, item in enumerate(audio_script)),
+                   visual=tuple(VisualSegment.from_dict(idx, item) for idx, item in enumerate(visual_script)))
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as file:
+        try:
+            return json.load(file)
+        except json.JSONDecodeError as e:
+            raise ScriptError(f"{path} contains invalid JSON: {e}")
+
+
+def _iter_lines(path):
+    # (type, object) of every line of a .jsonl script, lines without a type are header lines
+    with open(path, "r", encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ScriptError(f"{path}:{line_no} contains invalid JSON: {e}")
+            if not isinstance(item, dict):
+                raise ScriptError(f"{path}:{line_no} must be an object")
+            yield item.get("type", "header"), item
+
+
+def _iter_items(path, kind):
+    # Raw objects of audio_script or visual_script, read incrementally whenever the format allows it
+    if path.endswith(".jsonl"):
+        for item_type, item in _iter_lines(path):
+            if item_type == kind:
+                yield item
+    elif ijson is not None:
+        with open(path, "rb") as file:
+            try:
+                yield from ijson.items(file, f"{kind}_script.item")
+            except ijson.JSONError as e:
+                raise ScriptError(f"{path} contains invalid JSON: {e}")
+    else:
+        data = _load_json(path)
+        items = data.get(f"{kind}_script", []) if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise ScriptError(f"{path}: {kind}_script must be a list")
+        yield from items
+
+
+def _iter_segments(path, kind, segment_class):
+    for index, item in enumerate(_iter_items(path, kind)):
+        try:
+            segment = segment_class.from_dict(index, item)
+        except ScriptError as e:
+            raise ScriptError(f"{path}: {e}")
+        yield segment
+
+
+def iter_audio(path):
+    # Yields the AudioSegment of every audio_script entry, parsing the file as it goes
+    return _iter_segments(path, "audio", AudioSegment)
+
+
+def iter_visual(path):
+    # Yields the VisualSegment of every visual_script entry, parsing the file as it goes
+    return _iter_segments(path, "visual", VisualSegment)
+
+
+def read_header(path):
+    # Topic and description of a script, without reading its segments when the format allows it
+    if path.endswith(".jsonl"):
+        header = {}
+        for item_type, item in _iter_lines(path):
+            if item_type != "header":
+                break
+            header.update(item)
+    elif ijson is not None:
+        # Only the top level strings are kept, the segment arrays are skipped over without being built
+        header = {}
+        with open(path, "rb") as file:
+            try:
+                for prefix, event, value in ijson.parse(file):
+                    if prefix in ("topic", "description") and event == "string":
+                        header[prefix] = value
+                        if len(header) == 2:
+                            break
+            except ijson.JSONError as e:
+                raise ScriptError(f"{path} contains invalid JSON: {e}")
+    else:
+        header = _load_json(path)
+    return {"topic": header.get("topic", "No topic found"), "description": header.get("description", "")}
+
+
+def load_script(path):
+    # Raises FileNotFoundError if the file doesn't exist, ScriptError if it isn't a valid script
+    if path.endswith(".jsonl"):
+        # Single pass over the lines, the header and both kinds of segments are collected together
+        header = {}
+        items = {"audio": [], "visual": []}
+        for item_type, item in _iter_lines(path):
+            if item_type == "header":
+                header.update(item)
+            elif item_type in items:
+                items[item_type].append(item)
+        data = {**header, "audio_script": items["audio"], "visual_script": items["visual"]}
+    else:
+        data = _load_json(path)
+    try:
+        return Script.from_dict(data)
+    except ScriptError as e:
+        raise ScriptError(f"{path}: {e}")